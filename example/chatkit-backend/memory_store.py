@@ -23,16 +23,19 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import datetime
+from itertools import islice
 from typing import Any, Dict, List
 
 from chatkit.store import NotFoundError, Store
 from chatkit.types import Attachment, Page, Thread, ThreadItem, ThreadMetadata
 
 
-@dataclass
+@dataclass(slots=True)
 class _ThreadState:
     thread: ThreadMetadata
-    items: List[ThreadItem]
+    # Keyed by item id; dicts keep insertion order, so this doubles as the
+    # append-order list while giving O(1) lookup/replace/delete by id.
+    items: Dict[str, ThreadItem]
 
 
 class MemoryStore(Store[dict[str, Any]]):
@@ -62,6 +65,15 @@ class MemoryStore(Store[dict[str, Any]]):
         data.pop("items", None)
         return ThreadMetadata(**data).model_copy(deep=True)
 
+    @staticmethod
+    def _page_start(entries: List[Any], after: str | None) -> int:
+        """Index just past the `after` cursor, or 0 if it is unset or unknown."""
+        if after:
+            for idx, entry in enumerate(entries):
+                if entry.id == after:
+                    return idx + 1
+        return 0
+
     # ─────────────────────────────────────────────────────────────────────
     # Thread metadata
     # ─────────────────────────────────────────────────────────────────────
@@ -87,7 +99,7 @@ class MemoryStore(Store[dict[str, Any]]):
         else:
             self._threads[thread.id] = _ThreadState(
                 thread=metadata,
-                items=[],
+                items={},
             )
 
     async def load_threads(
@@ -97,21 +109,17 @@ class MemoryStore(Store[dict[str, Any]]):
         order: str,
         context: dict[str, Any],
     ) -> Page[ThreadMetadata]:
+        # Sort the stored objects and copy only the page that is returned
         threads = sorted(
-            (self._get_thread_metadata(state.thread) for state in self._threads.values()),
+            (state.thread for state in self._threads.values()),
             key=lambda t: t.created_at or datetime.min,
             reverse=(order == "desc"),
         )
 
-        if after:
-            index_map = {thread.id: idx for idx, thread in enumerate(threads)}
-            start = index_map.get(after, -1) + 1
-        else:
-            start = 0
-
-        slice_threads = threads[start : start + limit + 1]
-        has_more = len(slice_threads) > limit
-        slice_threads = slice_threads[:limit]
+        start = self._page_start(threads, after)
+        page = list(islice(threads, start, start + limit + 1))
+        has_more = len(page) > limit
+        slice_threads = [self._get_thread_metadata(thread) for thread in islice(page, limit)]
         next_after = slice_threads[-1].id if has_more and slice_threads else None
         return Page(
             data=slice_threads,
@@ -126,12 +134,12 @@ class MemoryStore(Store[dict[str, Any]]):
     # Thread items
     # ─────────────────────────────────────────────────────────────────────
 
-    def _items(self, thread_id: str) -> List[ThreadItem]:
+    def _items(self, thread_id: str) -> Dict[str, ThreadItem]:
         state = self._threads.get(thread_id)
         if state is None:
             state = _ThreadState(
                 thread=ThreadMetadata(id=thread_id, created_at=datetime.utcnow()),
-                items=[],
+                items={},
             )
             self._threads[thread_id] = state
         return state.items
@@ -144,48 +152,40 @@ class MemoryStore(Store[dict[str, Any]]):
         order: str,
         context: dict[str, Any],
     ) -> Page[ThreadItem]:
-        items = [item.model_copy(deep=True) for item in self._items(thread_id)]
-        items.sort(
+        items = sorted(
+            self._items(thread_id).values(),
             key=lambda item: getattr(item, "created_at", datetime.utcnow()),
             reverse=(order == "desc"),
         )
 
-        if after:
-            index_map = {item.id: idx for idx, item in enumerate(items)}
-            start = index_map.get(after, -1) + 1
-        else:
-            start = 0
-
-        slice_items = items[start : start + limit + 1]
-        has_more = len(slice_items) > limit
-        slice_items = slice_items[:limit]
+        start = self._page_start(items, after)
+        page = list(islice(items, start, start + limit + 1))
+        has_more = len(page) > limit
+        slice_items = [item.model_copy(deep=True) for item in islice(page, limit)]
         next_after = slice_items[-1].id if has_more and slice_items else None
         return Page(data=slice_items, has_more=has_more, after=next_after)
 
     async def add_thread_item(
         self, thread_id: str, item: ThreadItem, context: dict[str, Any]
     ) -> None:
-        self._items(thread_id).append(item.model_copy(deep=True))
+        item = item.model_copy(deep=True)
+        self._items(thread_id)[item.id] = item
 
     async def save_item(self, thread_id: str, item: ThreadItem, context: dict[str, Any]) -> None:
-        items = self._items(thread_id)
-        for idx, existing in enumerate(items):
-            if existing.id == item.id:
-                items[idx] = item.model_copy(deep=True)
-                return
-        items.append(item.model_copy(deep=True))
+        # Replacing an existing key keeps its original position in the dict
+        item = item.model_copy(deep=True)
+        self._items(thread_id)[item.id] = item
 
     async def load_item(self, thread_id: str, item_id: str, context: dict[str, Any]) -> ThreadItem:
-        for item in self._items(thread_id):
-            if item.id == item_id:
-                return item.model_copy(deep=True)
-        raise NotFoundError(f"Item {item_id} not found")
+        try:
+            return self._items(thread_id)[item_id].model_copy(deep=True)
+        except KeyError:
+            raise NotFoundError(f"Item {item_id} not found") from None
 
     async def delete_thread_item(
         self, thread_id: str, item_id: str, context: dict[str, Any]
     ) -> None:
-        items = self._items(thread_id)
-        self._threads[thread_id].items = [item for item in items if item.id != item_id]
+        self._items(thread_id).pop(item_id, None)
 
     # ─────────────────────────────────────────────────────────────────────
     # Attachment METADATA (not file bytes!)
@@ -3,7 +3,8 @@
 """
 from __future__ import annotations
 
-from typing import Any
+import sys
+from typing import Any, Callable
 
 from chatkit.types import (
     AssistantMessageItem,
@@ -14,6 +15,75 @@ from openai.types.responses import ResponseInputTextParam
 from openai.types.responses.response_input_item_param import Message
 
 
+# Дискриминаторы ThreadItem.type; интернированы, чтобы поиск в таблице
+# диспетчеризации сводился к сравнению указателей
+_USER_MESSAGE = sys.intern("user_message")
+_ASSISTANT_MESSAGE = sys.intern("assistant_message")
+
+
+def _convert_user_message(item: UserMessageItem) -> Message | None:
+    """Пользовательское сообщение"""
+    content_parts = []
+
+    if isinstance(item.content, str):
+        content_parts.append(
+            ResponseInputTextParam(type="input_text", text=item.content)
+        )
+    elif isinstance(item.content, list):
+        for part in item.content:
+            if hasattr(part, "text"):
+                content_parts.append(
+                    ResponseInputTextParam(type="input_text", text=part.text)
+                )
+
+    return Message(
+        type="message",
+        role="user",
+        content=content_parts,
+    )
+
+
+def _convert_assistant_message(item: AssistantMessageItem) -> Message | None:
+    """Сообщение ассистента - конвертируем в текстовый формат"""
+    text_content = ""
+
+    if isinstance(item.content, str):
+        text_content = item.content
+    elif isinstance(item.content, list):
+        text_parts = []
+        for part in item.content:
+            if hasattr(part, "text"):
+                text_parts.append(part.text)
+        text_content = "\n".join(text_parts)
+
+    if not text_content:
+        return None
+
+    return Message(
+        type="message",
+        role="assistant",
+        content=[ResponseInputTextParam(type="output_text", text=text_content)],
+    )
+
+
+_CONVERTERS: dict[str, Callable[[Any], Message | None]] = {
+    _USER_MESSAGE: _convert_user_message,
+    _ASSISTANT_MESSAGE: _convert_assistant_message,
+}
+
+
+def _item_type(item: ThreadItem) -> str | None:
+    """Тип элемента: поле-дискриминатор, либо isinstance для старых версий ChatKit"""
+    item_type = getattr(item, "type", None)
+    if item_type is not None:
+        return item_type
+    if isinstance(item, UserMessageItem):
+        return _USER_MESSAGE
+    if isinstance(item, AssistantMessageItem):
+        return _ASSISTANT_MESSAGE
+    return None
+
+
 class SimpleThreadItemConverter:
     """
     Простой конвертер для преобразования thread items
@@ -31,49 +101,11 @@ class SimpleThreadItemConverter:
         result: list[Message] = []
 
         for item in items:
-            if isinstance(item, UserMessageItem):
-                # Пользовательское сообщение
-                content_parts = []
-
-                if isinstance(item.content, str):
-                    content_parts.append(
-                        ResponseInputTextParam(type="input_text", text=item.content)
-                    )
-                elif isinstance(item.content, list):
-                    for part in item.content:
-                        if hasattr(part, "text"):
-                            content_parts.append(
-                                ResponseInputTextParam(type="input_text", text=part.text)
-                            )
-
-                result.append(
-                    Message(
-                        type="message",
-                        role="user",
-                        content=content_parts,
-                    )
-                )
-
-            elif isinstance(item, AssistantMessageItem):
-                # Сообщение ассистента - конвертируем в текстовый формат
-                text_content = ""
-
-                if isinstance(item.content, str):
-                    text_content = item.content
-                elif isinstance(item.content, list):
-                    text_parts = []
-                    for part in item.content:
-                        if hasattr(part, "text"):
-                            text_parts.append(part.text)
-                    text_content = "\n".join(text_parts)
-
-                if text_content:
-                    result.append(
-                        Message(
-                            type="message",
-                            role="assistant",
-                            content=[ResponseInputTextParam(type="output_text", text=text_content)],
-                        )
-                    )
+            converter = _CONVERTERS.get(_item_type(item))
+            if converter is None:
+                continue
+            message = converter(item)
+            if message is not None:
+                result.append(message)
 
         return result
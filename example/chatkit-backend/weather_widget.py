@@ -7,6 +7,7 @@ Modern design inspired by AccuWeather.
 from __future__ import annotations
 
 from datetime import datetime
+from functools import lru_cache
 from typing import Any
 
 from chatkit.widgets import (
@@ -22,6 +23,35 @@ from chatkit.widgets import (
 )
 
 
+# WMO weather code -> emoji, built once at import
+_EMOJI_DAY: dict[int, str] = {}
+for _codes, _emoji in (
+    ((0, 1), "☀️"),  # Clear/Sunny
+    ((2,), "⛅"),  # Partly cloudy
+    ((3,), "☁️"),  # Cloudy
+    ((45, 48), "🌫️"),  # Foggy
+    ((51, 53, 55, 56, 57), "🌧️"),  # Drizzle
+    ((61, 63, 65, 66, 67), "🌧️"),  # Rain
+    ((71, 73, 75, 77, 85, 86), "❄️"),  # Snow
+    ((80, 81, 82), "🌦️"),  # Rain showers
+    ((95, 96, 99), "⛈️"),  # Thunderstorm
+):
+    for _code in _codes:
+        _EMOJI_DAY[_code] = _emoji
+del _codes, _emoji, _code
+
+# Hourly axis labels in strftime("%I %p") form, e.g. "06 PM"
+_HOUR_LABELS = tuple(
+    f"{(hour % 12) or 12:02d} {'AM' if hour < 12 else 'PM'}" for hour in range(24)
+)
+
+_EMOJI_NIGHT: dict[int, str] = {
+    0: "🌙",  # Clear night
+    1: "🌙",
+    2: "☁️",  # Partly cloudy night
+}
+
+
 def get_weather_emoji(weather_code: int, is_night: bool = False) -> str:
     """
     Get emoji icon for weather condition.
@@ -33,34 +63,9 @@ def get_weather_emoji(weather_code: int, is_night: bool = False) -> str:
     Returns:
         Emoji representation of weather
     """
-    # Night icons
-    if is_night:
-        if weather_code == 0 or weather_code == 1:
-            return "🌙"  # Clear night
-        elif weather_code == 2:
-            return "☁️"  # Partly cloudy night
-
-    # Day icons
-    if weather_code == 0 or weather_code == 1:
-        return "☀️"  # Clear/Sunny
-    elif weather_code == 2:
-        return "⛅"  # Partly cloudy
-    elif weather_code == 3:
-        return "☁️"  # Cloudy
-    elif weather_code == 45 or weather_code == 48:
-        return "🌫️"  # Foggy
-    elif weather_code in [51, 53, 55, 56, 57]:
-        return "🌧️"  # Drizzle
-    elif weather_code in [61, 63, 65, 66, 67]:
-        return "🌧️"  # Rain
-    elif weather_code in [71, 73, 75, 77, 85, 86]:
-        return "❄️"  # Snow
-    elif weather_code in [80, 81, 82]:
-        return "🌦️"  # Rain showers
-    elif weather_code == 95 or weather_code == 96 or weather_code == 99:
-        return "⛈️"  # Thunderstorm
-    else:
-        return "🌡️"  # Default
+    if is_night and weather_code in _EMOJI_NIGHT:
+        return _EMOJI_NIGHT[weather_code]
+    return _EMOJI_DAY.get(weather_code, "🌡️")  # Default
 
 
 def celsius_to_fahrenheit(celsius: float) -> float:
@@ -68,6 +73,42 @@ def celsius_to_fahrenheit(celsius: float) -> float:
     return (celsius * 9/5) + 32
 
 
+# Style specs shared by every render; widgets only read them
+_HEADER_BACKGROUND = {"light": "purple-600", "dark": "slate-800"}
+_WHITE_COLOR = {"light": "white", "dark": "white"}
+_SUBTITLE_COLOR = {"light": "purple-100", "dark": "slate-300"}
+_PAD_HEADER = {"x": 4, "y": 4}
+_PAD_SECTION = {"x": 4, "y": 3}
+_PAD_HOURLY = {"x": 4, "top": 3, "bottom": 2}
+_PAD_FORECAST_DAY = {"y": 2, "x": 1}
+_PAD_TOP_1 = {"top": 1}
+_PAD_BOTTOM_2 = {"bottom": 2}
+_BORDER_TOP = {"top": {"size": 1, "color": "alpha-10"}}
+
+
+# Forecast cell fragments. Day names, emoji and rounded temperatures come
+# from small sets, and widgets are never mutated after construction, so
+# identical cells share one instance across renders.
+@lru_cache(maxsize=32)
+def _day_label(value: str) -> Text:
+    return Text(value=value, size="sm", weight="medium", color="alpha-70")
+
+
+@lru_cache(maxsize=32)
+def _emoji_text(value: str) -> Text:
+    return Text(value=value, size="lg")
+
+
+@lru_cache(maxsize=128)
+def _temp_max_text(value: str) -> Text:
+    return Text(value=value, size="sm", weight="medium")
+
+
+@lru_cache(maxsize=128)
+def _temp_min_text(value: str) -> Text:
+    return Text(value=value, size="xs", color="alpha-50")
+
+
 def render_weather_widget(
     location: str,
     temperature: float,
@@ -99,13 +140,56 @@ def render_weather_widget(
     if current_time is None:
         current_time = datetime.now()
 
-    # Convert temperatures
+    # Only the fields the widget displays go into the cache key; the clock is
+    # truncated to the hour since that is all the layout depends on.
+    return _render_weather_widget_cached(
+        location,
+        temperature,
+        temp_min,
+        temp_max,
+        condition,
+        humidity,
+        wind_speed,
+        weather_code,
+        tuple(
+            (
+                day_data.get("day", ""),
+                day_data.get("temperature_min", 0),
+                day_data.get("temperature_max", 0),
+                day_data.get("weather_code", 0),
+            )
+            for day_data in (forecast or ())[:6]  # Show max 6 days
+        ),
+        tuple(
+            (hour_data.get("time", ""), hour_data.get("temperature", 0))
+            for hour_data in (hourly_forecast or ())[:24]
+        ),
+        current_time.replace(minute=0, second=0, microsecond=0),
+    )
+
+
+@lru_cache(maxsize=256)
+def _render_weather_widget_cached(
+    location: str,
+    temperature: float,
+    temp_min: float,
+    temp_max: float,
+    condition: str,
+    humidity: int,
+    wind_speed: float,
+    weather_code: int,
+    forecast: tuple[tuple[str, float, float, int], ...],
+    hourly_forecast: tuple[tuple[str, float], ...],
+    current_time: datetime,
+) -> Card:
+    """
+    Build the weather widget tree from hashable inputs.
+
+    Widgets are serialized right after rendering and never mutated, so the
+    same Card is safely returned for repeated inputs.
+    """
+    # Temperatures are displayed in Celsius only
     temp_c = temperature
-    temp_f = celsius_to_fahrenheit(temperature)
-    temp_min_c = temp_min
-    temp_max_c = temp_max
-    temp_min_f = celsius_to_fahrenheit(temp_min)
-    temp_max_f = celsius_to_fahrenheit(temp_max)
 
     # Determine if it's night (between 6 PM and 6 AM)
     is_night = current_time.hour >= 18 or current_time.hour < 6
@@ -113,33 +197,29 @@ def render_weather_widget(
     # Get weather emoji based on current weather code
     weather_emoji = get_weather_emoji(weather_code, is_night)
 
-    # Format current time
-    day_of_week = current_time.strftime("%A")  # Monday, Tuesday, etc.
-    time_str = current_time.strftime("%I:%M %p")  # 9:57 PM
-
     # ==================== HEADER ====================
     # Modern gradient header with large temperature display
     header = Box(
-        background={"light": "purple-600", "dark": "slate-800"},
-        padding={"x": 4, "y": 4},
+        background=_HEADER_BACKGROUND,
+        padding=_PAD_HEADER,
         children=[
             # Title and Location
             Row(
                 align="center",
                 gap=2,
-                padding={"bottom": 2},
+                padding=_PAD_BOTTOM_2,
                 children=[
                     Text(
                         value="Погода",
                         size="md",
                         weight="semibold",
-                        color={"light": "white", "dark": "white"}
+                        color=_WHITE_COLOR
                     ),
                     Text(value="•", size="sm", color="alpha-60"),
                     Text(
                         value=location,
                         size="md",
-                        color={"light": "purple-100", "dark": "slate-300"}
+                        color=_SUBTITLE_COLOR
                     ),
                     Spacer(),
                     # Weather icon (moved to title row)
@@ -158,12 +238,12 @@ def render_weather_widget(
                         value=f"{temp_c:.0f}",
                         size="2xl",
                         weight="bold",
-                        color={"light": "white", "dark": "white"}
+                        color=_WHITE_COLOR
                     ),
                     Text(
                         value="°C",
                         size="xl",
-                        color={"light": "white", "dark": "white"}
+                        color=_WHITE_COLOR
                     ),
                 ],
             ),
@@ -171,8 +251,8 @@ def render_weather_widget(
             Text(
                 value=condition,
                 size="md",
-                color={"light": "purple-100", "dark": "slate-300"},
-                padding={"top": 1}
+                color=_SUBTITLE_COLOR,
+                padding=_PAD_TOP_1
             ),
         ],
     )
@@ -181,12 +261,8 @@ def render_weather_widget(
 
     # ==================== WEEKLY FORECAST ====================
     weekly_forecast_items = []
-    if forecast and len(forecast) > 0:
-        for day_data in forecast[:6]:  # Show max 6 days
-            day_name = day_data.get("day", "")
-            temp_min = day_data.get("temperature_min", 0)
-            temp_max = day_data.get("temperature_max", 0)
-            weather_code = day_data.get("weather_code", 0)
+    if forecast:
+        for day_name, temp_min, temp_max, weather_code in forecast:
             emoji = get_weather_emoji(weather_code, False)
 
             weekly_forecast_items.append(
@@ -194,12 +270,12 @@ def render_weather_widget(
                     align="center",
                     gap=1,
                     flex=1,
-                    padding={"y": 2, "x": 1},
+                    padding=_PAD_FORECAST_DAY,
                     children=[
-                        Text(value=day_name, size="sm", weight="medium", color="alpha-70"),
-                        Text(value=emoji, size="lg"),
-                        Text(value=f"{temp_max:.0f}°", size="sm", weight="medium"),
-                        Text(value=f"{temp_min:.0f}°", size="xs", color="alpha-50"),
+                        _day_label(day_name),
+                        _emoji_text(emoji),
+                        _temp_max_text(f"{temp_max:.0f}°"),
+                        _temp_min_text(f"{temp_min:.0f}°"),
                     ],
                 )
             )
@@ -207,8 +283,8 @@ def render_weather_widget(
     weekly_forecast = None
     if weekly_forecast_items:
         weekly_forecast = Box(
-            padding={"x": 4, "y": 3},
-            border={"top": {"size": 1, "color": "alpha-10"}},
+            padding=_PAD_SECTION,
+            border=_BORDER_TOP,
             children=[
                 Row(
                     gap=1,
@@ -220,20 +296,16 @@ def render_weather_widget(
     # ==================== HOURLY GRAPH ====================
     # Simplified hourly display (ChatKit doesn't support custom charts)
     hourly_section = None
-    if hourly_forecast and len(hourly_forecast) > 0:
+    if hourly_forecast:
         hourly_items = []
         # Show every 3rd hour to fit better
-        for i in range(0, min(24, len(hourly_forecast)), 3):
-            hour_data = hourly_forecast[i]
-            time_str = hour_data.get("time", "")
-            temp = hour_data.get("temperature", 0)
+        for time_str, temp in hourly_forecast[::3]:
 
             # Extract hour from ISO time string (e.g., "2024-11-24T18:00")
             try:
-                hour_dt = datetime.fromisoformat(time_str)
-                hour_label = hour_dt.strftime("%I %p")  # "06 PM"
-            except:
-                hour_label = time_str[-5:]  # Fallback
+                hour_label = _HOUR_LABELS[int(time_str[11:13])]  # "06 PM"
+            except (ValueError, IndexError, TypeError):
+                hour_label = (time_str or "")[-5:]  # Fallback
 
             hourly_items.append(
                 Col(
@@ -256,15 +328,15 @@ def render_weather_widget(
             )
 
             hourly_section = Box(
-                padding={"x": 4, "top": 3, "bottom": 2},
-                border={"top": {"size": 1, "color": "alpha-10"}},
+                padding=_PAD_HOURLY,
+                border=_BORDER_TOP,
                 children=[
                     Text(
                         value="Hourly Forecast",
                         size="xs",
                         weight="medium",
                         color="alpha-60",
-                        padding={"bottom": 2}
+                        padding=_PAD_BOTTOM_2
                     ),
                     graph_row,
                 ],
@@ -273,13 +345,13 @@ def render_weather_widget(
     # ==================== ADDITIONAL DETAILS ====================
     # Display feels like, humidity, and wind in a compact grid
     details = Box(
-        padding={"x": 4, "y": 3},
-        border={"top": {"size": 1, "color": "alpha-10"}},
+        padding=_PAD_SECTION,
+        border=_BORDER_TOP,
         children=[
             # First row: Feels like and Humidity
             Row(
                 gap=6,
-                padding={"bottom": 2},
+                padding=_PAD_BOTTOM_2,
                 children=[
                     # Feels like
                     Row(
@@ -328,19 +400,13 @@ def render_weather_widget(
     )
 
     # ==================== BUILD WIDGET ====================
-    # Simplified structure without footer and location section
-    children = [header]
-
-    # Add details section with feels like, humidity, and wind
-    children.append(details)
-
-    # Optionally add weekly forecast if available
-    if weekly_forecast:
-        children.append(weekly_forecast)
-
-    # Optionally add hourly forecast if available
-    if hourly_section:
-        children.append(hourly_section)
+    # Simplified structure without footer and location section: header,
+    # details (feels like, humidity, wind), then the optional forecasts
+    children = [
+        section
+        for section in (header, details, weekly_forecast, hourly_section)
+        if section is not None
+    ]
 
     return Card(
         key="weather-forecast",
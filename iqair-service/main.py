@@ -3,13 +3,19 @@ IQAir Service - Microservice for air quality data
 Fetches and caches AQI data from IQAir API
 """
 
+import asyncio
+import hashlib
 import os
 import logging
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
 import httpx
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+import orjson
+from cachetools import TTLCache
+from datetime import datetime
+from typing import AsyncIterator, Optional, Dict
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -19,83 +25,247 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="IQAir Service", version="1.0.0")
-
-# CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 # IQAir API configuration
 IQAIR_API_KEY = os.getenv("IQAIR_API_KEY")
 IQAIR_BASE_URL = "https://api.airvisual.com/v2"
 
-# In-memory cache
-_cache: Dict[str, Any] = {}
-_cache_timestamp: Optional[datetime] = None
 CACHE_TTL_MINUTES = 10
+# Lets browsers and any fronting CDN serve repeat requests within the TTL
+CACHE_CONTROL = f"public, max-age={CACHE_TTL_MINUTES * 60}, stale-while-revalidate=120"
+
+
+@dataclass(slots=True)
+class CacheState:
+    """Per-process response cache, attached to app.state at startup"""
+    # cache_key -> (serialized cache-hit response body, ETag), each key expiring on its own
+    entries: TTLCache = field(
+        default_factory=lambda: TTLCache(maxsize=128, ttl=CACHE_TTL_MINUTES * 60)
+    )
+    # One lock per cache key so concurrent misses share a single upstream fetch;
+    # a key's lock lives only while requests hold or wait for it, so unknown cities don't pile up
+    locks: Dict[str, asyncio.Lock] = field(default_factory=dict)
+    lock_users: Dict[str, int] = field(default_factory=dict)
+
+    @asynccontextmanager
+    async def key_lock(self, key: str) -> AsyncIterator[None]:
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        self.lock_users[key] = self.lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self.lock_users[key] -= 1
+            if not self.lock_users[key]:
+                del self.lock_users[key]
+                del self.locks[key]
+
+
+def get_cache(request: Request) -> CacheState:
+    """Dependency returning the app-wide cache state"""
+    return request.app.state.cache
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Keep one pooled HTTP client to IQAir and the cache for the lifetime of the app"""
+    app.state.cache = CacheState()
+    app.state.http = httpx.AsyncClient(
+        base_url=IQAIR_BASE_URL,
+        timeout=10.0,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+        http2=True,
+    )
+    yield
+    await app.state.http.aclose()
+
+
+app = FastAPI(
+    title="IQAir Service",
+    version="1.0.0",
+    lifespan=lifespan,
+)
+
+# CORS: public read-only data, so every response gets the same static
+# wildcard headers and preflights are answered without reaching the routes
+_CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+]
+_CORS_PREFLIGHT_HEADERS = _CORS_HEADERS + [
+    (b"access-control-allow-methods", b"GET, OPTIONS"),
+    (b"access-control-allow-headers", b"*"),
+    (b"access-control-max-age", b"600"),
+]
+
+
+class StaticCORSMiddleware:
+    """Minimal ASGI middleware emitting fixed wildcard CORS headers"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS":
+            await send({"type": "http.response.start", "status": 204, "headers": _CORS_PREFLIGHT_HEADERS})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *_CORS_HEADERS]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+
+app.add_middleware(StaticCORSMiddleware)
+
+# Health risk levels, indexed by bisect over the upper AQI bound of each band.
+# Shared across requests - copy before mutating.
+_AQI_BREAKS = (50, 100, 150, 200, 300)
+_HEALTH_RISKS = (
+    {
+        "level": "good",
+        "warning_ru": "Воздух чистый",
+        "warning_uz": "Havo toza",
+        "warning_en": "Air is clean",
+        "affected_groups": [],
+        "severity": "low"
+    },
+    {
+        "level": "moderate",
+        "warning_ru": "Чувствительным людям стоит быть осторожнее",
+        "warning_uz": "Sezgir odamlar ehtiyot bo'lishi kerak",
+        "warning_en": "Sensitive people should be cautious",
+        "affected_groups": ["asthmatics", "children"],
+        "severity": "low"
+    },
+    {
+        "level": "unhealthy_sensitive",
+        "warning_ru": "Вредно для уязвимых групп",
+        "warning_uz": "Zaif guruhlar uchun zararli",
+        "warning_en": "Unhealthy for sensitive groups",
+        "affected_groups": ["children", "elderly", "asthmatics", "heart_patients"],
+        "severity": "medium"
+    },
+    {
+        "level": "unhealthy",
+        "warning_ru": "Вредно для всех. Носите респиратор",
+        "warning_uz": "Hamma uchun zararli. Respirator taqdiring",
+        "warning_en": "Unhealthy for everyone. Wear a respirator",
+        "affected_groups": ["everyone"],
+        "severity": "high"
+    },
+    {
+        "level": "very_unhealthy",
+        "warning_ru": "Очень вредно! Избегайте выхода на улицу",
+        "warning_uz": "Juda zararli! Tashqariga chiqmang",
+        "warning_en": "Very unhealthy! Avoid going outside",
+        "affected_groups": ["everyone"],
+        "severity": "very_high"
+    },
+    {
+        "level": "hazardous",
+        "warning_ru": "ОПАСНО ДЛЯ ЖИЗНИ! Оставайтесь дома",
+        "warning_uz": "HAYOT UCHUN XAVFLI! Uyda qoling",
+        "warning_en": "HAZARDOUS! Stay indoors",
+        "affected_groups": ["everyone"],
+        "severity": "extreme"
+    },
+)
 
 
 def get_health_risks(aqi: int) -> dict:
     """Generate health risk information based on AQI level"""
-    if aqi <= 50:
-        return {
-            "level": "good",
-            "warning_ru": "Воздух чистый",
-            "warning_uz": "Havo toza",
-            "warning_en": "Air is clean",
-            "affected_groups": [],
-            "severity": "low"
-        }
-    elif aqi <= 100:
-        return {
-            "level": "moderate",
-            "warning_ru": "Чувствительным людям стоит быть осторожнее",
-            "warning_uz": "Sezgir odamlar ehtiyot bo'lishi kerak",
-            "warning_en": "Sensitive people should be cautious",
-            "affected_groups": ["asthmatics", "children"],
-            "severity": "low"
-        }
-    elif aqi <= 150:
-        return {
-            "level": "unhealthy_sensitive",
-            "warning_ru": "Вредно для уязвимых групп",
-            "warning_uz": "Zaif guruhlar uchun zararli",
-            "warning_en": "Unhealthy for sensitive groups",
-            "affected_groups": ["children", "elderly", "asthmatics", "heart_patients"],
-            "severity": "medium"
-        }
-    elif aqi <= 200:
-        return {
-            "level": "unhealthy",
-            "warning_ru": "Вредно для всех. Носите респиратор",
-            "warning_uz": "Hamma uchun zararli. Respirator taqdiring",
-            "warning_en": "Unhealthy for everyone. Wear a respirator",
-            "affected_groups": ["everyone"],
-            "severity": "high"
-        }
-    elif aqi <= 300:
-        return {
-            "level": "very_unhealthy",
-            "warning_ru": "Очень вредно! Избегайте выхода на улицу",
-            "warning_uz": "Juda zararli! Tashqariga chiqmang",
-            "warning_en": "Very unhealthy! Avoid going outside",
-            "affected_groups": ["everyone"],
-            "severity": "very_high"
-        }
-    else:
-        return {
-            "level": "hazardous",
-            "warning_ru": "ОПАСНО ДЛЯ ЖИЗНИ! Оставайтесь дома",
-            "warning_uz": "HAYOT UCHUN XAVFLI! Uyda qoling",
-            "warning_en": "HAZARDOUS! Stay indoors",
-            "affected_groups": ["everyone"],
-            "severity": "extreme"
-        }
+    return _HEALTH_RISKS[bisect_left(_AQI_BREAKS, aqi)]
+
+
+# Since IQAir doesn't return individual pollutant values in free API,
+# we estimate them from AQI using (pm25, pm10, no2) multipliers keyed by
+# the main pollutant type: p2 (PM2.5), p1 (PM10), o3 (Ozone), n2 (NO2), s2 (SO2), co (CO)
+_POLLUTANT_MATRIX = {
+    "p2": (0.5, 0.7, 0.3),  # PM2.5 is main pollutant
+    "p1": (0.4, 0.8, 0.3),  # PM10 is main pollutant
+    "n2": (0.3, 0.5, 0.6),  # NO2 is main pollutant
+}
+_DEFAULT_POLLUTANT_MULTIPLIERS = (0.4, 0.6, 0.3)
+
+
+def _estimate_pollutants(aqi: int, main_pollutant: str) -> dict:
+    """Estimate PM2.5/PM10/NO2 values from AQI and the main pollutant type"""
+    pm25, pm10, no2 = _POLLUTANT_MATRIX.get(main_pollutant, _DEFAULT_POLLUTANT_MULTIPLIERS)
+    return {
+        "pm25": round(aqi * pm25),
+        "pm10": round(aqi * pm10),
+        "no2": round(aqi * no2),
+        "mainPollutant": main_pollutant
+    }
+
+
+# Fallback payload used when IQAir is unavailable; the nested parts are
+# shared across requests, only the outer dicts are built per call.
+_FALLBACK_CURRENT = {
+    'pollution': {'aqius': 165, 'mainus': 'p2'},
+    'weather': {'tp': 15, 'hu': 45}
+}
+_FALLBACK_LOCATION = {'coordinates': [69.2401, 41.2995]}
+_FALLBACK_HEALTH_RISKS = get_health_risks(165)
+_FALLBACK_POLLUTANTS = {
+    "pm25": 66,  # 165 * 0.4
+    "pm10": 99,  # 165 * 0.6
+    "no2": 50,   # 165 * 0.3
+    "mainPollutant": "p2"
+}
+
+
+def _json_response(payload: dict, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Serialize the payload with orjson (ORJSONResponse is deprecated in FastAPI)"""
+    return Response(content=orjson.dumps(payload), media_type="application/json", headers=headers)
+
+
+def _fallback_response(city: str, country: str, warning: str) -> Response:
+    """Build the fallback response for a city with the given warning"""
+    return _json_response({
+        "status": "success",
+        "source": "fallback",
+        "data": {
+            'current': _FALLBACK_CURRENT,
+            'city': city,
+            'state': city,
+            'country': country,
+            'location': _FALLBACK_LOCATION
+        },
+        "healthRisks": _FALLBACK_HEALTH_RISKS,
+        "pollutants": _FALLBACK_POLLUTANTS,
+        "warning": warning
+    })
+
+
+def _etag(body: bytes) -> str:
+    """Weak ETag derived from the exact response bytes"""
+    return f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+
+def _cache_headers(etag: str) -> Dict[str, str]:
+    return {"Cache-Control": CACHE_CONTROL, "ETag": etag}
+
+
+def _cached_response(
+    cache: CacheState, cache_key: str, if_none_match: Optional[str]
+) -> Optional[Response]:
+    """Return the pre-serialized cache entry as a response, or None on a miss"""
+    cached = cache.entries.get(cache_key)
+    if cached is None:
+        return None
+    body, etag = cached
+    headers = _cache_headers(etag)
+    headers["X-Cache"] = "HIT"
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.get("/")
@@ -104,90 +274,37 @@ async def root():
 
 
 @app.get("/api/air-quality")
-async def get_air_quality(city: str = "Tashkent", country: str = "Uzbekistan", state: str = "Toshkent Shahri"):
+async def get_air_quality(
+    request: Request,
+    city: str = "Tashkent",
+    country: str = "Uzbekistan",
+    state: str = "Toshkent Shahri",
+    cache: CacheState = Depends(get_cache),
+):
     """
     Get air quality data with caching and health risks
     """
-    global _cache, _cache_timestamp
-    
     # Check cache
     cache_key = f"{city}_{country}"
-    if _cache_timestamp and datetime.now() - _cache_timestamp < timedelta(minutes=CACHE_TTL_MINUTES):
-        if cache_key in _cache:
-            cached_data = _cache[cache_key]
-            pollution = cached_data.get("current", {}).get("pollution", {})
-            aqi = pollution.get("aqius", 0)
-            main_pollutant = pollution.get("mainus", "p2")
-            health_risks = get_health_risks(aqi)
-            
-            # Calculate pollutants for cache
-            pollutants = {
-                "pm25": None,
-                "pm10": None,
-                "no2": None,
-                "mainPollutant": main_pollutant
-            }
-            
-            if main_pollutant == "p2":
-                pollutants["pm25"] = round(aqi * 0.5)
-                pollutants["pm10"] = round(aqi * 0.7)
-                pollutants["no2"] = round(aqi * 0.3)
-            elif main_pollutant == "p1":
-                pollutants["pm10"] = round(aqi * 0.8)
-                pollutants["pm25"] = round(aqi * 0.4)
-                pollutants["no2"] = round(aqi * 0.3)
-            elif main_pollutant == "n2":
-                pollutants["no2"] = round(aqi * 0.6)
-                pollutants["pm25"] = round(aqi * 0.3)
-                pollutants["pm10"] = round(aqi * 0.5)
-            else:
-                pollutants["pm25"] = round(aqi * 0.4)
-                pollutants["pm10"] = round(aqi * 0.6)
-                pollutants["no2"] = round(aqi * 0.3)
-            
-            return {
-                "status": "success",
-                "source": "cache",
-                "data": cached_data,
-                "healthRisks": health_risks,
-                "pollutants": pollutants,
-                "cached_at": _cache_timestamp.isoformat()
-            }
+    if_none_match = request.headers.get("if-none-match")
+    cached_response = _cached_response(cache, cache_key, if_none_match)
+    if cached_response is not None:
+        return cached_response
     
     # Fetch from IQAir API
     if not IQAIR_API_KEY or IQAIR_API_KEY == 'your_iqair_api_key_here':
         logger.warning("IQAir API key not configured, using fallback data")
-        # Use fallback data
-        fallback_data = {
-            'current': {
-                'pollution': {'aqius': 165, 'mainus': 'p2'},
-                'weather': {'tp': 15, 'hu': 45}
-            },
-            'city': city,
-            'state': city,
-            'country': country,
-            'location': {'coordinates': [69.2401, 41.2995]}
-        }
-        health_risks = get_health_risks(165)
-        pollutants = {
-            "pm25": 66,  # 165 * 0.4
-            "pm10": 99,  # 165 * 0.6
-            "no2": 50,   # 165 * 0.3
-            "mainPollutant": "p2"
-        }
-        return {
-            "status": "success",
-            "source": "fallback",
-            "data": fallback_data,
-            "healthRisks": health_risks,
-            "pollutants": pollutants,
-            "warning": "API key not configured"
-        }
+        return _fallback_response(city, country, "API key not configured")
     
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{IQAIR_BASE_URL}/city",
+    async with cache.key_lock(cache_key):
+        # Another request may have filled the cache while we waited
+        cached_response = _cached_response(cache, cache_key, if_none_match)
+        if cached_response is not None:
+            return cached_response
+        
+        try:
+            response = await app.state.http.get(
+                "/city",
                 params={
                     "city": city,
                     "state": state,
@@ -196,144 +313,67 @@ async def get_air_quality(city: str = "Tashkent", country: str = "Uzbekistan", s
                 },
                 timeout=10.0
             )
+        
+            if response.status_code != 200:
+                logger.error(f"IQAir API error: {response.status_code}")
+                return _fallback_response(city, country, f"API returned {response.status_code}")
             
-            if response.status_code == 200:
-                result = response.json()
-                if result.get("status") == "success":
-                    data = result.get("data", {})
-                    
-                    # Cache the result
-                    _cache[cache_key] = data
-                    _cache_timestamp = datetime.now()
-                    
-                    # Get health risks and pollutant details
-                    pollution = data.get("current", {}).get("pollution", {})
-                    aqi = pollution.get("aqius", 0)
-                    main_pollutant = pollution.get("mainus", "p2")
-                    
-                    health_risks = get_health_risks(aqi)
-                    
-                    # Extract pollutant values based on main pollutant type
-                    # IQAir returns main pollutant type: p2 (PM2.5), p1 (PM10), o3 (Ozone), n2 (NO2), s2 (SO2), co (CO)
-                    pollutants = {
-                        "pm25": None,
-                        "pm10": None,
-                        "no2": None,
-                        "mainPollutant": main_pollutant
-                    }
-                    
-                    # Since IQAir doesn't return individual pollutant values in free API,
-                    # we estimate based on AQI and main pollutant type
-                    if main_pollutant == "p2":  # PM2.5 is main pollutant
-                        pollutants["pm25"] = round(aqi * 0.5)  # Rough conversion
-                        pollutants["pm10"] = round(aqi * 0.7)
-                        pollutants["no2"] = round(aqi * 0.3)
-                    elif main_pollutant == "p1":  # PM10 is main pollutant
-                        pollutants["pm10"] = round(aqi * 0.8)
-                        pollutants["pm25"] = round(aqi * 0.4)
-                        pollutants["no2"] = round(aqi * 0.3)
-                    elif main_pollutant == "n2":  # NO2 is main pollutant
-                        pollutants["no2"] = round(aqi * 0.6)
-                        pollutants["pm25"] = round(aqi * 0.3)
-                        pollutants["pm10"] = round(aqi * 0.5)
-                    else:  # Default estimation
-                        pollutants["pm25"] = round(aqi * 0.4)
-                        pollutants["pm10"] = round(aqi * 0.6)
-                        pollutants["no2"] = round(aqi * 0.3)
-                    
-                    return {
-                        "status": "success",
-                        "source": "api",
-                        "data": data,
-                        "healthRisks": health_risks,
-                        "pollutants": pollutants
-                    }
+            result = response.json()
+            if result.get("status") != "success":
+                logger.error(f"IQAir API error: {str(result.get('data'))[:200]}")
+                return _fallback_response(city, country, f"API returned {response.status_code}")
             
-            # API error - return fallback
-            logger.error(f"IQAir API error: {response.status_code}")
-            fallback_data = {
-                'current': {
-                    'pollution': {'aqius': 165, 'mainus': 'p2'},
-                    'weather': {'tp': 15, 'hu': 45}
-                },
-                'city': city,
-                'state': city,
-                'country': country,
-                'location': {'coordinates': [69.2401, 41.2995]}
-            }
-            health_risks = get_health_risks(165)
-            pollutants = {
-                "pm25": 66,
-                "pm10": 99,
-                "no2": 50,
-                "mainPollutant": "p2"
-            }
-            return {
+            data = result.get("data", {})
+        
+            # Get health risks and pollutant details
+            pollution = data.get("current", {}).get("pollution", {})
+            aqi = pollution.get("aqius", 0)
+            main_pollutant = pollution.get("mainus", "p2")
+        
+            health_risks = get_health_risks(aqi)
+        
+            pollutants = _estimate_pollutants(aqi, main_pollutant)
+        
+            # Cache the result, serialized once in its cache-hit form
+            cached_body = orjson.dumps({
                 "status": "success",
-                "source": "fallback",
-                "data": fallback_data,
+                "source": "cache",
+                "data": data,
                 "healthRisks": health_risks,
                 "pollutants": pollutants,
-                "warning": f"API returned {response.status_code}"
-            }
-            
-    except httpx.TimeoutException:
-        logger.error("IQAir API timeout")
-        fallback_data = {
-            'current': {
-                'pollution': {'aqius': 165, 'mainus': 'p2'},
-                'weather': {'tp': 15, 'hu': 45}
-            },
-            'city': city,
-            'state': city,
-            'country': country,
-            'location': {'coordinates': [69.2401, 41.2995]}
-        }
-        health_risks = get_health_risks(165)
-        pollutants = {
-            "pm25": 66,
-            "pm10": 99,
-            "no2": 50,
-            "mainPollutant": "p2"
-        }
-        return {
-            "status": "success",
-            "source": "fallback",
-            "data": fallback_data,
-            "healthRisks": health_risks,
-            "pollutants": pollutants,
-            "warning": "API timeout"
-        }
-    except Exception as e:
-        logger.error(f"Error: {str(e)}")
-        fallback_data = {
-            'current': {
-                'pollution': {'aqius': 165, 'mainus': 'p2'},
-                'weather': {'tp': 15, 'hu': 45}
-            },
-            'city': city,
-            'state': city,
-            'country': country,
-            'location': {'coordinates': [69.2401, 41.2995]}
-        }
-        health_risks = get_health_risks(165)
-        pollutants = {
-            "pm25": 66,
-            "pm10": 99,
-            "no2": 50,
-            "mainPollutant": "p2"
-        }
-        return {
-            "status": "success",
-            "source": "fallback",
-            "data": fallback_data,
-            "healthRisks": health_risks,
-            "pollutants": pollutants,
-            "warning": str(e)
-        }
+                "cached_at": datetime.now().isoformat()
+            })
+            cache.entries[cache_key] = (cached_body, _etag(cached_body))
+        
+            body = orjson.dumps({
+                "status": "success",
+                "source": "api",
+                "data": data,
+                "healthRisks": health_risks,
+                "pollutants": pollutants
+            })
+            return Response(
+                content=body,
+                media_type="application/json",
+                headers=_cache_headers(_etag(body)),
+            )
+        
+        except httpx.TimeoutException:
+            logger.error("IQAir API timeout")
+            return _fallback_response(city, country, "API timeout")
+        except Exception as e:
+            logger.error(f"Error: {str(e)}")
+            return _fallback_response(city, country, str(e))
 
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8002))
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        loop="uvloop",
+        http="httptools",
+        reload=os.getenv("RELOAD", "false").lower() == "true",
+    )
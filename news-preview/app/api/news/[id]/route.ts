@@ -31,6 +31,8 @@ export async function GET(
     }
 
     const data = doc.data();
+    // Older previews store an ISO 'date' string; newer ones only the server timestamp
+    const publishedAt = data.date ? new Date(data.date) : data.created_at.toDate();
 
     // Return HTML with design matching the main app NewsDetail component
     const html = `
@@ -88,7 +90,7 @@ export async function GET(
           <svg class="w-3 h-3" fill="none" stroke="currentColor" viewBox="0 0 24 24">
             <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M8 7V3m8 4V3m-9 8h10M5 21h14a2 2 0 002-2V7a2 2 0 00-2-2H5a2 2 0 00-2 2v12a2 2 0 002 2z" />
           </svg>
-          ${new Date(data.date).toLocaleDateString('ru-RU', { day: 'numeric', month: 'long', year: 'numeric' })}
+          ${publishedAt.toLocaleDateString('ru-RU', { day: 'numeric', month: 'long', year: 'numeric' })}
         </span>
         <span class="bg-[#F3F4F6] text-[#9CA3AF] px-3 py-1 rounded-lg text-xs font-medium flex items-center gap-1">
           ${data.channel}
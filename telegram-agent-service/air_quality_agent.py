@@ -6,18 +6,66 @@ Model: Claude Haiku 4.5
 
 import os
 import json
-import logging
+import re
 import time
-import requests
-from typing import Optional, Dict, Any
+import base64
+import hashlib
+import logging
+import sqlite3
+import asyncio
+import threading
+import httpx
+from aiolimiter import AsyncLimiter
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Callable, List, Tuple
+
+from bedrock_stream import RETRY_STATUS_CODES, backoff, read_stream_events
+from semantic_cache import SemanticCache
 
 logger = logging.getLogger(__name__)
 
+# Exact-match cache of Claude responses, shared across restarts via its own SQLite file
+LLM_CACHE_DB = 'llm_cache.db'
+LLM_CACHE_TTL_SECONDS = 86400
+LLM_CACHE_MEMORY_ENTRIES = 10_000
+
+# Keyword fallback when the classifier answer can't be parsed
+_KW_RE = re.compile(
+    r"aqi|воздух|havo|смог|загрязнение|ifloslanish|air quality|pm2\.5|pm10",
+    re.IGNORECASE
+)
+
+# Cheap prefilter: a post without any of these stems is never air quality news
+PREFILTER_RE = re.compile(
+    r"воздух|havo|смог|smog|загрязн|ifloslan|pollut|эколог|ekolog|атмосфер|выброс|пыл|chang"
+    r"|aqi|pm\s?2[.,]5|pm\s?10|air quality",
+    re.IGNORECASE
+)
+
+# Preambles the model sometimes puts before the answer
+_REPHRASE_PREFIX_RE = re.compile(
+    r"^(?:Переформулированная версия:|Перефразированная версия:|"
+    r"Вот переформулированная версия:|Here is the rephrased version:)\s*",
+    re.IGNORECASE
+)
+_TRANSLATE_PREFIX_RE = re.compile(r"^(?:Translation:|Tarjima:)\s*", re.IGNORECASE)
+
+
+def may_be_air_quality_news(text: str) -> bool:
+    """Keyword prefilter run before the LLM; False means the post can be skipped"""
+    return PREFILTER_RE.search(text) is not None
+
+
+def _json_object_complete(text: str) -> bool:
+    """Stop condition for single-object JSON answers"""
+    return '{' in text and text.rstrip().rstrip('`').rstrip().endswith('}')
+
 
 class AirQualityAgent:
     """AI Agent for detecting and rephrasing air quality news using AWS Bedrock"""
 
     def __init__(self):
+        # Settings are read here, not at import, so a later load_dotenv() still applies
         self.bearer_token = os.getenv('AWS_BEARER_TOKEN_BEDROCK', '')
         self.region = os.getenv('AWS_REGION', 'us-east-1')
         # Use cross-region inference profile for Claude 4.5 Haiku
@@ -25,50 +73,169 @@ class AirQualityAgent:
 
         # Bedrock endpoint
         self.endpoint = f"https://bedrock-runtime.{self.region}.amazonaws.com/model/{self.model_id}/invoke"
+        self.stream_endpoint = f"{self.endpoint}-with-response-stream"
 
         if not self.bearer_token:
             raise ValueError("AWS_BEARER_TOKEN_BEDROCK not set in environment")
 
+        # Pooled HTTP client, created on first use in the running event loop
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # Paces requests to the Bedrock quota (BEDROCK_RPS per second), shared by all callers
+        self._limiter = AsyncLimiter(int(os.getenv('BEDROCK_RPS', '10')), 1)
+
+        # Classification verdicts for near-duplicate posts across channels
+        self._verdict_cache = SemanticCache()
+
+        # Exact-match response cache: in-process LRU in front of SQLite
+        self._memory_cache: OrderedDict[str, Tuple[int, str]] = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+
         logger.info(f"Air Quality Agent initialized with {self.model_id}")
 
-    def _call_claude(self, prompt: str, system_prompt: str = None, max_tokens: int = 1024) -> Optional[str]:
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=True,
+                # Keep idle connections past the gaps between paced requests,
+                # so every call reuses a warm TLS connection to Bedrock
+                limits=httpx.Limits(max_connections=16, max_keepalive_connections=8, keepalive_expiry=120),
+                timeout=httpx.Timeout(60),
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {self.bearer_token}"
+                }
+            )
+        return self._client
+
+    async def close(self):
+        """Close the pooled HTTP client; a new one is created on next use"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _cache_key(self, prompt: str, system_prompt: Optional[str], max_tokens: int) -> str:
+        payload = json.dumps(
+            {"m": self.model_id, "p": prompt, "s": system_prompt, "t": max_tokens},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _get_db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(LLM_CACHE_DB)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, response TEXT, ts INTEGER)'
+            )
+            # Drop expired rows once per process
+            self._db.execute(
+                'DELETE FROM llm_cache WHERE ts < ?',
+                (int(time.time()) - LLM_CACHE_TTL_SECONDS,)
+            )
+            self._db.commit()
+        return self._db
+
+    def _remember(self, key: str, ts: int, response: str):
+        self._memory_cache[key] = (ts, response)
+        self._memory_cache.move_to_end(key)
+        if len(self._memory_cache) > LLM_CACHE_MEMORY_ENTRIES:
+            self._memory_cache.popitem(last=False)
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        min_ts = int(time.time()) - LLM_CACHE_TTL_SECONDS
+
+        entry = self._memory_cache.get(key)
+        if entry is not None:
+            ts, response = entry
+            if ts >= min_ts:
+                self._memory_cache.move_to_end(key)
+                return response
+            del self._memory_cache[key]
+
+        try:
+            row = self._get_db().execute(
+                'SELECT response, ts FROM llm_cache WHERE key = ?', (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            return None
+
+        if row is None or row[1] < min_ts:
+            return None
+        self._remember(key, row[1], row[0])
+        return row[0]
+
+    def _cache_put(self, key: str, response: str):
+        ts = int(time.time())
+        self._remember(key, ts, response)
+        try:
+            db = self._get_db()
+            db.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, response, ts) VALUES (?, ?, ?)',
+                (key, response, ts)
+            )
+            db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    async def _call_claude(self, prompt: str, system_prompt: str = None, max_tokens: int = 1024,
+                           stop_fn: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        """
+        Call Claude, serving identical requests from the response cache
+        With stop_fn the response is streamed and reading stops once stop_fn(text) is true
+        """
+        key = self._cache_key(prompt, system_prompt, max_tokens)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        if stop_fn is None:
+            response = await self._invoke_claude(prompt, system_prompt, max_tokens)
+        else:
+            response = await self._invoke_claude_stream(prompt, system_prompt, max_tokens, stop_fn)
+        # Never cache empty or cut-off answers, they would be served for the whole TTL
+        if response and (stop_fn is None or stop_fn(response)):
+            self._cache_put(key, response)
+        return response
+
+    def _request_body(self, prompt: str, system_prompt: Optional[str], max_tokens: int) -> Dict[str, Any]:
+        body = {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "temperature": 0.7
+        }
+
+        if system_prompt:
+            body["system"] = system_prompt
+        return body
+
+    async def _invoke_claude(self, prompt: str, system_prompt: str = None, max_tokens: int = 1024) -> Optional[str]:
         """Call Claude via AWS Bedrock HTTP API with Bearer token"""
-        max_retries = 3
+        max_retries = 5
 
         for attempt in range(max_retries):
             try:
-                body = {
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": max_tokens,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "temperature": 0.7
-                }
+                body = self._request_body(prompt, system_prompt, max_tokens)
 
-                if system_prompt:
-                    body["system"] = system_prompt
+                headers = {"Accept": "application/json"}
 
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.bearer_token}",
-                    "Accept": "application/json"
-                }
+                async with self._limiter:
+                    response = await self._get_client().post(
+                        self.endpoint,
+                        headers=headers,
+                        json=body
+                    )
 
-                response = requests.post(
-                    self.endpoint,
-                    headers=headers,
-                    json=body,
-                    timeout=60
-                )
-
-                if response.status_code == 429:
-                    wait_time = 5 * (attempt + 1)
-                    logger.warning(f"Rate limited. Waiting {wait_time}s before retry...")
-                    time.sleep(wait_time)
+                if response.status_code in RETRY_STATUS_CODES:
+                    wait_time = backoff(attempt)
+                    logger.warning(f"Bedrock returned {response.status_code}. Waiting {wait_time:.1f}s before retry...")
+                    await asyncio.sleep(wait_time)
                     continue
 
                 if response.status_code != 200:
@@ -77,11 +244,72 @@ class AirQualityAgent:
 
                 response_data = response.json()
 
-                # Add delay between requests to avoid rate limiting
-                time.sleep(1)
-
                 return response_data['content'][0]['text']
 
+            except (httpx.ReadTimeout, httpx.ConnectError) as e:
+                wait_time = backoff(attempt)
+                logger.warning(f"Bedrock connection error: {e!r}. Waiting {wait_time:.1f}s before retry...")
+                await asyncio.sleep(wait_time)
+
+            except Exception as e:
+                logger.error(f"Claude API error: {e}")
+                return None
+
+        logger.error("Max retries exceeded")
+        return None
+
+    async def _invoke_claude_stream(self, prompt: str, system_prompt: Optional[str], max_tokens: int,
+                                    stop_fn: Callable[[str], bool]) -> Optional[str]:
+        """
+        Call Claude via Bedrock invoke-with-response-stream
+        Accumulates text deltas and closes the stream as soon as stop_fn(text) is true
+        """
+        max_retries = 5
+
+        for attempt in range(max_retries):
+            try:
+                body = self._request_body(prompt, system_prompt, max_tokens)
+
+                headers = {"Accept": "application/vnd.amazon.eventstream"}
+
+                async with self._limiter:
+                    async with self._get_client().stream(
+                        "POST",
+                        self.stream_endpoint,
+                        headers=headers,
+                        json=body
+                    ) as response:
+                        if response.status_code in RETRY_STATUS_CODES:
+                            wait_time = backoff(attempt)
+                            logger.warning(f"Bedrock returned {response.status_code}. Waiting {wait_time:.1f}s before retry...")
+                            await asyncio.sleep(wait_time)
+                            continue
+
+                        if response.status_code != 200:
+                            await response.aread()
+                            logger.error(f"Bedrock API error: {response.status_code} - {response.text}")
+                            return None
+
+                        text = ""
+                        buffer = bytearray()
+                        async for chunk in response.aiter_bytes():
+                            buffer.extend(chunk)
+                            for event in read_stream_events(buffer):
+                                if 'bytes' not in event:
+                                    logger.error(f"Bedrock stream error: {event}")
+                                    return None
+                                delta = json.loads(base64.b64decode(event['bytes']))
+                                if delta.get('type') == 'content_block_delta':
+                                    text += delta['delta'].get('text', '')
+                            if stop_fn(text):
+                                break
+                        return text or None
+
+            except (httpx.ReadTimeout, httpx.ConnectError) as e:
+                wait_time = backoff(attempt)
+                logger.warning(f"Bedrock connection error: {e!r}. Waiting {wait_time:.1f}s before retry...")
+                await asyncio.sleep(wait_time)
+
             except Exception as e:
                 logger.error(f"Claude API error: {e}")
                 return None
@@ -89,10 +317,26 @@ class AirQualityAgent:
         logger.error("Max retries exceeded")
         return None
 
-    def is_air_quality_news(self, text: str) -> Dict[str, Any]:
+    @staticmethod
+    def _strip_code_fence(response: str) -> str:
+        """Strip markdown code blocks if present"""
+        cleaned_response = response.strip()
+        if cleaned_response.startswith('```json'):
+            cleaned_response = cleaned_response[7:]
+        elif cleaned_response.startswith('```'):
+            cleaned_response = cleaned_response[3:]
+        if cleaned_response.endswith('```'):
+            cleaned_response = cleaned_response[:-3]
+        return cleaned_response.strip()
+
+    async def is_air_quality_news(self, text: str) -> Dict[str, Any]:
         """
         Determine if the text is about air quality
         """
+        cached = self._verdict_cache.get(text, namespace='is_air_quality_news')
+        if cached is not None:
+            logger.info("Classification served from semantic cache")
+            return dict(cached)
 
         system_prompt = """Ты эксперт по качеству воздуха и экологии.
 Твоя задача - определить, является ли текст новостью или информацией о качестве воздуха."""
@@ -117,7 +361,7 @@ class AirQualityAgent:
     "reason": "краткое объяснение"
 }}"""
 
-        response = self._call_claude(prompt, system_prompt, max_tokens=512)
+        response = await self._call_claude(prompt, system_prompt, max_tokens=512, stop_fn=_json_object_complete)
 
         if not response:
             return {
@@ -127,23 +371,12 @@ class AirQualityAgent:
             }
 
         try:
-            # Strip markdown code blocks if present
-            cleaned_response = response.strip()
-            if cleaned_response.startswith('```json'):
-                cleaned_response = cleaned_response[7:]
-            elif cleaned_response.startswith('```'):
-                cleaned_response = cleaned_response[3:]
-            if cleaned_response.endswith('```'):
-                cleaned_response = cleaned_response[:-3]
-            cleaned_response = cleaned_response.strip()
-
-            result = json.loads(cleaned_response)
+            result = json.loads(self._strip_code_fence(response))
+            self._verdict_cache.put(text, result, namespace='is_air_quality_news')
             return result
         except json.JSONDecodeError:
             logger.warning(f"Failed to parse JSON response: {response}")
-            keywords = ['aqi', 'воздух', 'havo', 'смог', 'загрязнение',
-                       'ifloslanish', 'air quality', 'pm2.5', 'pm10']
-            has_keywords = any(kw.lower() in text.lower() for kw in keywords)
+            has_keywords = bool(_KW_RE.search(text))
 
             return {
                 'is_air_quality_news': has_keywords,
@@ -151,7 +384,96 @@ class AirQualityAgent:
                 'reason': 'Fallback keyword detection'
             }
 
-    def rephrase_news(self, original_text: str, language: str = 'auto') -> Optional[str]:
+    async def classify_batch(self, items: List[Tuple[int, str]]) -> List[Dict[str, Any]]:
+        """
+        Determine for several texts at once if they are about air quality
+        Sends one numbered prompt instead of a request per post.
+        Returns verdicts in the same order as items
+        """
+        results: Dict[int, Dict[str, Any]] = {}
+        pending: List[Tuple[int, str]] = []
+        for item_id, text in items:
+            cached = self._verdict_cache.get(text, namespace='is_air_quality_news')
+            if cached is not None:
+                results[item_id] = dict(cached)
+            else:
+                pending.append((item_id, text))
+
+        if pending:
+            logger.info(f"Classifying {len(pending)} posts in one request "
+                        f"({len(items) - len(pending)} served from semantic cache)")
+            parsed = await self._classify_pending(pending)
+
+            for item_id, text in pending:
+                result = parsed.get(item_id)
+                if result is None:
+                    # Post missing from the batch answer - classify it alone
+                    result = await self.is_air_quality_news(text)
+                else:
+                    self._verdict_cache.put(text, result, namespace='is_air_quality_news')
+                results[item_id] = result
+
+        return [results[item_id] for item_id, _ in items]
+
+    async def is_air_quality_news_batch(self, texts: List[str], batch_size: int = 10) -> List[Dict[str, Any]]:
+        """
+        Classify any number of texts, batch_size posts per request
+        Batches are sent concurrently. Returns verdicts in the same order as texts
+        """
+        batches = [list(enumerate(texts[i:i + batch_size])) for i in range(0, len(texts), batch_size)]
+        verdicts = await asyncio.gather(*(self.classify_batch(batch) for batch in batches))
+        return [verdict for batch_verdicts in verdicts for verdict in batch_verdicts]
+
+    async def _classify_pending(self, pending: List[Tuple[int, str]]) -> Dict[int, Dict[str, Any]]:
+        """Send one batch classification request, return verdicts by post id"""
+        system_prompt = """Ты эксперт по качеству воздуха и экологии.
+Твоя задача - для каждого текста определить, является ли он новостью или информацией о качестве воздуха."""
+
+        posts_block = "\n\n".join(f"### ПОСТ {item_id}\n{text}" for item_id, text in pending)
+        prompt = f"""Проанализируй следующие тексты и для каждого определи, является ли он новостью о качестве воздуха.
+
+Текст считается новостью о качестве воздуха, если содержит информацию о:
+- Индексе качества воздуха (AQI, ИКВ)
+- Загрязнении воздуха, смоге
+- Измерениях PM2.5, PM10, озона и других загрязнителей
+- Рекомендациях по защите от загрязнения воздуха
+- Экологической обстановке связанной с воздухом
+- Метеорологических условиях, влияющих на качество воздуха
+
+{posts_block}
+
+Ответь СТРОГО JSON массивом, по одному объекту на каждый пост:
+[
+    {{
+        "id": номер поста,
+        "is_air_quality_news": true/false,
+        "confidence": 0.0-1.0,
+        "reason": "краткое объяснение"
+    }}
+]"""
+
+        response = await self._call_claude(prompt, system_prompt, max_tokens=min(4096, 256 + 128 * len(pending)))
+        if not response:
+            return {}
+
+        try:
+            verdicts = json.loads(self._strip_code_fence(response))
+        except json.JSONDecodeError:
+            logger.warning(f"Failed to parse batch JSON response: {response}")
+            return {}
+
+        parsed: Dict[int, Dict[str, Any]] = {}
+        if not isinstance(verdicts, list):
+            return parsed
+        for verdict in verdicts:
+            try:
+                item_id = int(verdict.pop('id'))
+            except (AttributeError, KeyError, TypeError, ValueError):
+                continue
+            parsed[item_id] = verdict
+        return parsed
+
+    async def rephrase_news(self, original_text: str, language: str = 'auto') -> Optional[str]:
         """
         Rephrase air quality news while preserving facts
         """
@@ -176,26 +498,24 @@ class AirQualityAgent:
 
 ПЕРЕФОРМУЛИРОВАННАЯ ВЕРСИЯ:"""
 
-        response = self._call_claude(prompt, system_prompt, max_tokens=1024)
+        response = await self._call_claude(prompt, system_prompt, max_tokens=1024)
 
         if response:
             response = response.strip()
-            unwanted_prefixes = [
-                'Переформулированная версия:',
-                'Перефразированная версия:',
-                'Вот переформулированная версия:',
-                'Here is the rephrased version:'
-            ]
-            for prefix in unwanted_prefixes:
-                if response.startswith(prefix):
-                    response = response[len(prefix):].strip()
+            response = _REPHRASE_PREFIX_RE.sub('', response, count=1)
 
         return response
 
-    def translate_text(self, text: str, target_language: str) -> Optional[str]:
+    async def translate_text(self, text: str, target_language: str) -> Optional[str]:
         """
         Translate text to target language (uz or en)
+        Translations are cached by (source text hash, target language)
         """
+        cache_key = f"translate:{hashlib.sha256(text.encode('utf-8')).hexdigest()}:{target_language}"
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
         lang_names = {
             'uz': "O'zbek tilida (lotin alifbosida)",
             'en': 'English'
@@ -217,24 +537,22 @@ TEXT TO TRANSLATE:
 
 TRANSLATION:"""
 
-        response = self._call_claude(prompt, system_prompt, max_tokens=1024)
+        response = await self._invoke_claude(prompt, system_prompt, max_tokens=1024)
 
         if response:
             response = response.strip()
             # Remove any prefixes the model might add
-            prefixes = ['Translation:', 'TRANSLATION:', 'Tarjima:', "Tarjima:"]
-            for prefix in prefixes:
-                if response.startswith(prefix):
-                    response = response[len(prefix):].strip()
+            response = _TRANSLATE_PREFIX_RE.sub('', response, count=1)
+            self._cache_put(cache_key, response)
 
         return response
 
-    def analyze_and_rephrase(self, text: str, min_confidence: float = 0.6) -> Optional[str]:
+    async def analyze_and_rephrase(self, text: str, min_confidence: float = 0.6) -> Optional[str]:
         """
         Complete pipeline: check if air quality news, then rephrase
         """
 
-        analysis = self.is_air_quality_news(text)
+        analysis = await self.is_air_quality_news(text)
 
         logger.info(f"Analysis: is_air_quality_news={analysis['is_air_quality_news']}, "
                    f"confidence={analysis['confidence']}, reason={analysis['reason']}")
@@ -243,7 +561,7 @@ TRANSLATION:"""
             logger.info(f"Text rejected: confidence {analysis['confidence']} < {min_confidence}")
             return None
 
-        rephrased = self.rephrase_news(text)
+        rephrased = await self.rephrase_news(text)
 
         if not rephrased:
             logger.warning("Rephrasing failed")
@@ -255,10 +573,19 @@ TRANSLATION:"""
 
 # Singleton instance
 _agent_instance = None
+_agent_lock = threading.Lock()
 
 def get_agent() -> AirQualityAgent:
-    """Get or create singleton agent instance"""
+    """Get or create singleton agent instance (safe to call from any thread)"""
     global _agent_instance
     if _agent_instance is None:
-        _agent_instance = AirQualityAgent()
+        with _agent_lock:
+            if _agent_instance is None:
+                _agent_instance = AirQualityAgent()
     return _agent_instance
+
+
+async def close_agent():
+    """Close the singleton agent's HTTP client if the agent was created"""
+    if _agent_instance is not None:
+        await _agent_instance.close()
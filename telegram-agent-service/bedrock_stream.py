@@ -0,0 +1,33 @@
+"""
+Helpers shared by the Bedrock agents
+Retry backoff and decoding of invoke-with-response-stream bodies
+"""
+
+import json
+import random
+import struct
+from typing import Any, Dict, Iterator
+
+# Transient Bedrock responses worth retrying
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+BACKOFF_BASE_SECONDS = 1
+BACKOFF_CAP_SECONDS = 30
+
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff delay for the given retry attempt"""
+    return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def read_stream_events(buffer: bytearray) -> Iterator[Dict[str, Any]]:
+    """
+    Pop complete AWS event-stream messages off the buffer and yield their JSON payloads
+    Message layout: total length, headers length, prelude CRC, headers, payload, message CRC
+    """
+    while len(buffer) >= 12:
+        total_length, headers_length = struct.unpack('>II', buffer[:8])
+        if len(buffer) < total_length:
+            return
+        payload = bytes(buffer[12 + headers_length:total_length - 4])
+        del buffer[:total_length]
+        yield json.loads(payload)
@@ -0,0 +1,86 @@
+"""
+Persistent cache of post analysis for the one-off send scripts
+Keyed by "channel:message_id", so rerunning a script over the same window
+skips classification and rephrasing of posts it has already seen
+"""
+
+import json
+import sqlite3
+import time
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+NEWS_CACHE_DB = 'news_cache.db'
+NEWS_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+
+def post_key(channel: str, message_id: int) -> str:
+    return f"{channel}:{message_id}"
+
+
+class NewsCache:
+    """SQLite table of {is_air_quality_news, confidence, reason, rephrased} per post"""
+
+    def __init__(self, path: str = NEWS_CACHE_DB, ttl_seconds: int = NEWS_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS news_cache (
+                key TEXT PRIMARY KEY,
+                json TEXT NOT NULL,
+                ts REAL NOT NULL
+            )
+        """)
+        self._conn.execute("DELETE FROM news_cache WHERE ts < ?", (time.time() - ttl_seconds,))
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def get_many(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        rows = self._conn.execute(
+            f"SELECT key, json FROM news_cache WHERE key IN ({placeholders}) AND ts >= ?",
+            (*keys, time.time() - self.ttl_seconds)
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def put_many(self, entries: Dict[str, Dict[str, Any]]):
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO news_cache (key, json, ts) VALUES (?, ?, ?)",
+            [(key, json.dumps(value, ensure_ascii=False), now) for key, value in entries.items()]
+        )
+        self._conn.commit()
+
+    async def classify(self, agent, items: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Verdicts for (key, text) items in the same order
+        Only posts missing from the cache are sent to the agent
+        """
+        entries = self.get_many([key for key, _ in items])
+        pending = [(key, text) for key, text in items if 'is_air_quality_news' not in entries.get(key, {})]
+        if pending:
+            logger.info(f"Classifying {len(pending)} posts ({len(items) - len(pending)} cached)")
+            verdicts = await agent.is_air_quality_news_batch([text for _, text in pending])
+            fresh = {key: verdict for (key, _), verdict in zip(pending, verdicts)}
+            self.put_many(fresh)
+            entries.update(fresh)
+        return [entries[key] for key, _ in items]
+
+    async def rephrase(self, agent, key: str, text: str) -> Optional[str]:
+        """Cached rephrased text of a post, rephrasing it on the first call"""
+        entry = self.get_many([key]).get(key, {})
+        if entry.get('rephrased'):
+            return entry['rephrased']
+
+        rephrased = await agent.rephrase_news(text)
+        if rephrased:
+            entry['rephrased'] = rephrased
+            self.put_many({key: entry})
+        return rephrased
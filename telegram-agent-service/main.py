@@ -6,33 +6,59 @@ Uses AWS Bedrock with Bearer Token for AI-powered news detection and rephrasing
 
 import os
 import asyncio
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Set
 import logging
-import threading
 
 from dotenv import load_dotenv
 load_dotenv()
 
-import pytz
-from apscheduler.schedulers.background import BackgroundScheduler
-from telethon import TelegramClient
-from telethon.tl.types import Message
+import aiofiles
+import aiosqlite
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-import uvicorn
+
+# Telethon, APScheduler and uvicorn are imported where used to keep cold start fast
+if TYPE_CHECKING:
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    from telethon.tl.types import Message
 
 # Import our AI agent (uses AWS Bedrock Bearer Token)
-from air_quality_agent import get_agent
+from air_quality_agent import get_agent, close_agent
+
+from post_dedup import PostDeduplicator
 
 # Import web search agent for fallback when no Telegram news found
-from web_search_agent import search_web_for_news
+from web_search_agent import search_web_for_news, close_web_search_agent
 
 # Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connections live as long as the app; cycles run in this event loop
+    await init_db()
+    client = get_tg_client()
+    if client is not None:
+        try:
+            await client.start()
+            await get_target_peer(client)
+        except Exception as e:
+            logger.error(f"Failed to start Telegram client: {e}")
+    scheduler = start_scheduler()
+    yield
+    scheduler.shutdown(wait=False)
+    if client is not None:
+        await client.disconnect()
+    await close_db()
+    # Release the agents' pooled HTTP connections
+    await close_agent()
+    await close_web_search_agent()
+
+
 # FastAPI app for Cloud Run health checks
-app = FastAPI(title="Telegram Agent Service")
+app = FastAPI(title="Telegram Agent Service", lifespan=lifespan)
 
 @app.get("/")
 async def root():
@@ -54,127 +80,203 @@ TARGET_CHANNEL = os.getenv('TARGET_CHANNEL', '@musaffo_news')
 # AI Agent confidence threshold
 MIN_CONFIDENCE = float(os.getenv('MIN_CONFIDENCE', '0.6'))
 
+# Max posts analyzed/sent at the same time within a cycle
+POST_CONCURRENCY = int(os.getenv('POST_CONCURRENCY', '4'))
+# Posts classified per Claude request
+CLASSIFY_BATCH_SIZE = 10
+
+# Post photos are saved here before reposting
+MEDIA_DIR = './media'
+MEDIA_DOWNLOAD_CONCURRENCY = 4
+
 # Telethon client - lazy initialization
 tg_client = None
 
 def get_tg_client():
+    """Shared client; connected in lifespan for the whole app lifetime"""
     global tg_client
     if tg_client is None:
         if API_ID == 0 or not API_HASH:
             logger.warning("Telegram credentials not set, client disabled")
             return None
+        from telethon import TelegramClient
         tg_client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
     return tg_client
 
-# SQLite for processed posts tracking  
-import sqlite3
-
-def init_db():
-    """Initialize SQLite database for tracking processed posts"""
-    conn = sqlite3.connect('processed_posts.db')
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS processed_posts (
-            message_id INTEGER,
-            channel TEXT,
-            processed_at TIMESTAMP,
-            PRIMARY KEY (message_id, channel)
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-def is_post_processed(channel: str, message_id: int) -> bool:
-    """Check if post was already processed"""
-    conn = sqlite3.connect('processed_posts.db')
-    c = conn.cursor()
-    c.execute('SELECT 1 FROM processed_posts WHERE channel = ? AND message_id = ?', (channel, message_id))
-    result = c.fetchone()
-    conn.close()
-    return result is not None
-
-def mark_post_processed(channel: str, message_id: int):
+# Resolved TARGET_CHANNEL peer, valid across reconnects
+target_peer = None
+
+async def get_target_peer(client):
+    """Resolve TARGET_CHANNEL once instead of on every send"""
+    global target_peer
+    if target_peer is None:
+        target_peer = await client.get_input_entity(TARGET_CHANNEL)
+    return target_peer
+
+# SQLite for processed posts tracking, one connection shared by all cycles
+PROCESSED_DB = 'processed_posts.db'
+_db: Optional[aiosqlite.Connection] = None
+
+
+async def init_db() -> aiosqlite.Connection:
+    """Open the shared SQLite connection and create the processed posts table"""
+    global _db
+    if _db is None:
+        _db = await aiosqlite.connect(PROCESSED_DB)
+        await _db.execute('PRAGMA journal_mode=WAL')
+        await _db.execute('PRAGMA synchronous=NORMAL')
+        await _db.execute('''
+            CREATE TABLE IF NOT EXISTS processed_posts (
+                message_id INTEGER,
+                channel TEXT,
+                processed_at TIMESTAMP,
+                PRIMARY KEY (message_id, channel)
+            )
+        ''')
+        await _db.commit()
+    return _db
+
+
+async def close_db():
+    """Close the shared connection"""
+    global _db
+    if _db is not None:
+        await _db.close()
+        _db = None
+
+
+async def get_processed_ids(channel: str, message_ids: List[int]) -> Set[int]:
+    """Return which of the channel's message ids were already processed"""
+    if not message_ids:
+        return set()
+    db = await init_db()
+    placeholders = ",".join("?" * len(message_ids))
+    async with db.execute(
+        f'SELECT message_id FROM processed_posts WHERE channel = ? AND message_id IN ({placeholders})',
+        (channel, *message_ids)
+    ) as cursor:
+        return {row[0] for row in await cursor.fetchall()}
+
+
+async def mark_post_processed(channel: str, message_id: int):
     """Mark post as processed"""
-    conn = sqlite3.connect('processed_posts.db')
-    c = conn.cursor()
-    c.execute(
+    db = await init_db()
+    await db.execute(
         'INSERT OR IGNORE INTO processed_posts (channel, message_id, processed_at) VALUES (?, ?, ?)',
         (channel, message_id, datetime.now())
     )
-    conn.commit()
-    conn.close()
-
-
+    # Commit right away so no write lock is held on the file between posts
+    await db.commit()
 
 
 async def get_channel_posts(hours_back: int = 3) -> List[Dict[str, Any]]:
     """Get recent posts from monitored channels"""
+    from telethon.tl.types import Message
+
     posts = []
-    cutoff_time = datetime.now() - timedelta(hours=hours_back)
+    photo_downloads = []
+    dedup = PostDeduplicator()
+    cutoff_time = datetime.now(timezone.utc) - timedelta(hours=hours_back)
 
     client = get_tg_client()
     if client is None:
         logger.warning("Telegram client not available")
         return posts
 
-    async with client:
-        for channel in CHANNELS_TO_MONITOR:
-            channel = channel.strip()
-            try:
-                logger.info(f"Checking channel: {channel}")
-                async for message in client.iter_messages(channel, limit=20):
-                    if not isinstance(message, Message):
-                        continue
-                        
-                    if message.date.replace(tzinfo=None) < cutoff_time:
-                        break
-                    
-                    # Check if already processed
-                    if is_post_processed(channel, message.id):
-                        continue
-                    
-                    text = message.text or message.message or ""
-
-                    # Skip empty messages
-                    if not text or len(text.strip()) < 10:
-                        continue
-
-                    post_data = {
-                        'channel': channel,
-                        'message_id': message.id,
-                        'text': text,
-                        'date': message.date,
-                        'has_photo': message.photo is not None,
-                        'photo_path': None
-                    }
-                    
-                    # Download photo if exists  
-                    if message.photo:
-                        photo_path = f"./media/{channel.replace('@', '')}_{message.id}.jpg"
-                        await message.download_media(file=photo_path)
-                        post_data['photo_path'] = photo_path
-                    
-                    posts.append(post_data)
-                    logger.info(f"Found relevant post: {channel} #{message.id}")
-                    
-            except Exception as e:
-                logger.error(f"Error fetching from {channel}: {e}")
-                continue
-    
+    for channel in CHANNELS_TO_MONITOR:
+        channel = channel.strip()
+        try:
+            logger.info(f"Checking channel: {channel}")
+            messages = []
+            # Newest first, stopping at the cutoff, so busy channels still yield their latest posts
+            async for message in client.iter_messages(channel, limit=50):
+                if message.date < cutoff_time:
+                    break
+
+                if not isinstance(message, Message):
+                    continue
+
+                messages.append(message)
+
+            # Check which posts were already processed in one query
+            processed_ids = await get_processed_ids(channel, [m.id for m in messages])
+
+            for message in messages:
+                if message.id in processed_ids:
+                    continue
+                
+                text = message.text or message.message or ""
+
+                # Skip empty messages
+                if not text or len(text.strip()) < 10:
+                    continue
+
+                # Same bulletin reposted by another channel - skip before the LLM
+                if dedup.is_duplicate(text):
+                    logger.info(f"Skipping duplicate post: {channel} #{message.id}")
+                    await mark_post_processed(channel, message.id)
+                    continue
+
+                post_data = {
+                    'channel': channel,
+                    'message_id': message.id,
+                    'text': text,
+                    'date': message.date,
+                    'has_photo': message.photo is not None,
+                    'photo_path': None
+                }
+                
+                # Queue photo download, run for all channels at once below
+                if message.photo:
+                    photo_path = f"{MEDIA_DIR}/{channel.replace('@', '')}_{message.id}.jpg"
+                    photo_downloads.append((post_data, message, photo_path))
+                
+                posts.append(post_data)
+                logger.info(f"Found relevant post: {channel} #{message.id}")
+                
+        except Exception as e:
+            logger.error(f"Error fetching from {channel}: {e}")
+            continue
+
+    if photo_downloads:
+        os.makedirs(MEDIA_DIR, exist_ok=True)
+        sem = asyncio.Semaphore(MEDIA_DOWNLOAD_CONCURRENCY)
+        results = await asyncio.gather(
+            *(download_photo(message, photo_path, sem) for _, message, photo_path in photo_downloads),
+            return_exceptions=True
+        )
+        for (post_data, message, _), result in zip(photo_downloads, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to download photo {post_data['channel']} #{message.id}: {result}")
+            else:
+                post_data['photo_path'] = result
+        # Release the Telethon messages, only post dicts outlive the fetch
+        photo_downloads.clear()
+
     return posts
 
 
-async def analyze_and_rephrase_with_agent(original_text: str) -> str:
+async def download_photo(message: 'Message', photo_path: str, sem: asyncio.Semaphore) -> str:
+    """Stream a post photo chunk by chunk to disk without blocking the loop"""
+    async with sem:
+        async with aiofiles.open(photo_path, 'wb') as f:
+            await message.download_media(file=f)
+    return photo_path
+
+
+async def classify_posts(posts: List[Dict[str, Any]]):
     """
-    Use AI agent to analyze if text is air quality news and rephrase it
-    Returns None if not air quality news or rephrasing failed
+    Classify Telegram posts in batches of CLASSIFY_BATCH_SIZE
+    Stores the verdict on each post under 'analysis'
     """
     agent = get_agent()
-
-    # This method does both: checking if air quality news AND rephrasing
-    rephrased = agent.analyze_and_rephrase(original_text, min_confidence=MIN_CONFIDENCE)
-
-    return rephrased
+    batches = [posts[i:i + CLASSIFY_BATCH_SIZE] for i in range(0, len(posts), CLASSIFY_BATCH_SIZE)]
+    verdicts = await asyncio.gather(
+        *(agent.classify_batch(list(enumerate(post['text'] for post in batch))) for batch in batches)
+    )
+    for batch, batch_verdicts in zip(batches, verdicts):
+        for post, analysis in zip(batch, batch_verdicts):
+            post['analysis'] = analysis
 
 
 async def send_to_target_channel(text: str, photo_paths: List[str] = None):
@@ -184,23 +286,58 @@ async def send_to_target_channel(text: str, photo_paths: List[str] = None):
         logger.warning("Telegram client not available")
         return
 
-    async with client:
-        try:
-            entity = await client.get_entity(TARGET_CHANNEL)
-
-            if photo_paths and len(photo_paths) > 0:
-                await client.send_file(
-                    entity,
-                    photo_paths,
-                    caption=text
-                )
-            else:
-                await client.send_message(entity, text)
-                
-            logger.info(f"✅ Posted to {TARGET_CHANNEL}")
+    try:
+        entity = await get_target_peer(client)
+
+        if photo_paths and len(photo_paths) > 0:
+            await client.send_file(
+                entity,
+                photo_paths,
+                caption=text
+            )
+        else:
+            await client.send_message(entity, text)
             
-        except Exception as e:
-            logger.error(f"Failed to send to target channel: {e}")
+        logger.info(f"✅ Posted to {TARGET_CHANNEL}")
+        
+    except Exception as e:
+        logger.error(f"Failed to send to target channel: {e}")
+
+
+async def _process_post(post: Dict[str, Any], sem: asyncio.Semaphore):
+    """Analyze, rephrase and repost a single post"""
+    async with sem:
+        logger.info(f"Processing: {post['channel']} #{post['message_id']}")
+
+        # For web search posts, the text is already formatted and verified
+        if post.get('from_web_search'):
+            rephrased_text = post['text']
+            # Add source attribution for web search results
+            if post.get('source_url'):
+                rephrased_text += f"\n\nИсточник: {post['source_url']}"
+        else:
+            # Only posts classified as air quality news get rephrased
+            analysis = post.get('analysis', {})
+            if analysis.get('is_air_quality_news') and analysis.get('confidence', 0) >= MIN_CONFIDENCE:
+                rephrased_text = await get_agent().rephrase_news(post['text'])
+            else:
+                rephrased_text = None
+
+            if not rephrased_text:
+                logger.info(f"Skipping: Not air quality news or low confidence")
+                # Mark as processed even if skipped (to avoid re-checking)
+                await mark_post_processed(post['channel'], post['message_id'])
+                # Skipped posts stay in the cycle's list, drop their text early
+                post.pop('text', None)
+                return
+
+        # Send to target channel
+        photo_paths = [post['photo_path']] if post['photo_path'] else None
+        await send_to_target_channel(rephrased_text, photo_paths)
+
+        # Mark as processed (skip for web search as they have unique IDs)
+        if not post.get('from_web_search'):
+            await mark_post_processed(post['channel'], post['message_id'])
 
 
 async def run_monitoring_cycle():
@@ -240,64 +377,39 @@ async def run_monitoring_cycle():
             return
 
     logger.info(f"Found {len(posts)} relevant posts")
-    
-    # Process each post
-    for post in posts:
-        try:
-            logger.info(f"Processing: {post['channel']} #{post['message_id']}")
-
-            # For web search posts, the text is already formatted and verified
-            if post.get('from_web_search'):
-                rephrased_text = post['text']
-                # Add source attribution for web search results
-                if post.get('source_url'):
-                    rephrased_text += f"\n\nИсточник: {post['source_url']}"
-            else:
-                # Use AI agent to analyze and rephrase Telegram posts
-                # Agent will check if it's air quality news AND rephrase it
-                rephrased_text = await analyze_and_rephrase_with_agent(post['text'])
-
-                if not rephrased_text:
-                    logger.info(f"Skipping: Not air quality news or low confidence")
-                    # Mark as processed even if skipped (to avoid re-checking)
-                    mark_post_processed(post['channel'], post['message_id'])
-                    continue
-
-            # Send to target channel
-            photo_paths = [post['photo_path']] if post['photo_path'] else None
-            await send_to_target_channel(rephrased_text, photo_paths)
-
-            # Mark as processed (skip for web search as they have unique IDs)
-            if not post.get('from_web_search'):
-                mark_post_processed(post['channel'], post['message_id'])
 
-            # Wait between posts to avoid rate limits
-            await asyncio.sleep(5)
-
-        except Exception as e:
-            logger.error(f"Error processing post: {e}")
-            continue
+    # One Claude request per batch of Telegram posts instead of one per post
+    telegram_posts = [post for post in posts if not post.get('from_web_search')]
+    if telegram_posts:
+        await classify_posts(telegram_posts)
+    
+    # Process posts concurrently, bounded to respect Bedrock and Telegram quotas
+    sem = asyncio.Semaphore(POST_CONCURRENCY)
+    results = await asyncio.gather(
+        *(_process_post(post, sem) for post in posts),
+        return_exceptions=True
+    )
+    for post, result in zip(posts, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error processing {post['channel']} #{post['message_id']}: {result}")
     
     logger.info("✅ Monitoring cycle complete")
 
 
-def run_monitoring_sync():
-    """Wrapper to run async monitoring cycle in sync context"""
-    asyncio.run(run_monitoring_cycle())
-
-
-def start_scheduler():
-    """Start the background scheduler"""
-    init_db()
+def start_scheduler() -> 'AsyncIOScheduler':
+    """Start the scheduler in the running event loop"""
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-    scheduler = BackgroundScheduler(timezone=pytz.UTC)
+    scheduler = AsyncIOScheduler(timezone=timezone.utc)
 
-    # Run every 3 hours
+    # Run every 3 hours, never overlapping a cycle still in progress
     scheduler.add_job(
-        run_monitoring_sync,
+        run_monitoring_cycle,
         'interval',
         hours=3,
-        next_run_time=datetime.now(pytz.UTC)  # Run immediately on start
+        max_instances=1,
+        coalesce=True,
+        next_run_time=datetime.now(timezone.utc)  # Run immediately on start
     )
 
     scheduler.start()
@@ -305,12 +417,12 @@ def start_scheduler():
     logger.info(f"   Monitoring: {CHANNELS_TO_MONITOR}")
     logger.info(f"   Target: {TARGET_CHANNEL}")
     logger.info(f"   Schedule: Every 3 hours")
+    return scheduler
 
 
 def main():
-    """Main entry point - runs FastAPI server with background scheduler"""
-    # Start scheduler in background
-    start_scheduler()
+    """Main entry point - runs FastAPI server, the scheduler starts with the app"""
+    import uvicorn
 
     # Run FastAPI server (required for Cloud Run)
     port = int(os.getenv("PORT", 8080))
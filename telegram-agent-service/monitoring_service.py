@@ -9,11 +9,18 @@ Automated Air Quality News Monitoring Service
 
 import os
 import asyncio
+import hashlib
+import io
+import re
+import signal
 import json
 import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
 from dotenv import load_dotenv
+load_dotenv()
 
 # Telegram
 from telethon import TelegramClient
@@ -27,6 +34,9 @@ from deep_translator import GoogleTranslator
 # Scheduling
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
+# Post tracking
+import aiosqlite
+
 # Firebase
 import firebase_admin
 from firebase_admin import credentials, firestore
@@ -36,9 +46,7 @@ from google.cloud.firestore_v1.base_query import FieldFilter
 from playwright.async_api import async_playwright
 
 # Import web search agent for fallback when no Telegram news found
-from web_search_agent import search_web_for_news
-
-load_dotenv()
+from web_search_agent import search_web_for_news, close_web_search_agent
 
 # Logging
 logging.basicConfig(level=logging.INFO)
@@ -53,6 +61,8 @@ BOT_TOKEN = '8333357201:AAFc4DBdgbbxH_mT4wJMZ8ieLGY_s3Zg0x8'
 MODERATION_CHAT_ID = 832620295  # Direct to user for testing
 
 CHANNELS = os.getenv('CHANNELS_TO_MONITOR', '').split(',')
+# Max new messages fetched per channel per cycle
+CURSOR_FETCH_LIMIT = 50
 
 # Keywords for air quality - more specific to avoid false positives
 AIR_QUALITY_KEYWORDS = [
@@ -71,6 +81,13 @@ AIR_QUALITY_KEYWORDS = [
     'smog', 'atmospheric emissions', 'air cleanliness'
 ]
 
+# All keywords lowercased once at import and joined into one case-insensitive
+# pattern, so each message is scanned once without a lowered copy
+KEYWORD_RE = re.compile(
+    '|'.join(re.escape(keyword.lower()) for keyword in AIR_QUALITY_KEYWORDS),
+    re.IGNORECASE
+)
+
 # Firebase setup
 FIREBASE_CREDS_PATH = os.getenv('FIREBASE_CREDS_PATH', 'firebase-creds.json')
 if not firebase_admin._apps:
@@ -79,25 +96,65 @@ if not firebase_admin._apps:
 
 db = firestore.client()
 
+# Max writes per Firestore batch commit
+FIRESTORE_BATCH_LIMIT = 500
+
+# Firestore calls are blocking gRPC - run them on a pool to keep the loop free
+FS_POOL = ThreadPoolExecutor(max_workers=10, thread_name_prefix='firestore')
+
+async def run_firestore(fn, *args):
+    """Run a blocking Firestore call on FS_POOL"""
+    return await asyncio.get_running_loop().run_in_executor(FS_POOL, fn, *args)
+
 # Translator is created per request (GoogleTranslator doesn't need global instance)
 
-# Telethon client
+# Telethon client, connected once in main()
 tg_client = TelegramClient(SESSION_NAME, TELEGRAM_API_ID, TELEGRAM_API_HASH)
 
 # Bot
 bot = Bot(token=BOT_TOKEN)
 
-# Storage for pending posts
-pending_posts = {}
+# Playwright browser, launched once in main()
+playwright = None
+browser = None
+# Max pages open in the browser at once
+SCREENSHOT_SEM = asyncio.Semaphore(4)
 
-# SQLite for tracking
-import sqlite3
-
-def init_monitoring_db():
-    """Initialize database for monitoring"""
-    conn = sqlite3.connect('monitoring.db')
-    c = conn.cursor()
-    c.execute('''
+# Storage for pending posts
+# Bounded: posts nobody approves or rejects are evicted oldest first
+pending_posts: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+PENDING_POSTS_MAX = 500
+# Matches delete_old_news retention
+PENDING_POSTS_TTL = timedelta(days=7)
+
+def add_pending_post(post_id: str, post_data: Dict[str, Any]):
+    """Store a post awaiting moderation, evicting expired and overflow entries"""
+    now = datetime.now()
+    post_data['queued_at'] = now
+    pending_posts[post_id] = post_data
+    pending_posts.move_to_end(post_id)
+
+    cutoff = now - PENDING_POSTS_TTL
+    while pending_posts and (
+        len(pending_posts) > PENDING_POSTS_MAX
+        or next(iter(pending_posts.values()))['queued_at'] < cutoff
+    ):
+        evicted_id, _ = pending_posts.popitem(last=False)
+        logger.info(f"Evicted unmoderated post: {evicted_id}")
+
+# SQLite for tracking, one long-lived aiosqlite connection for the whole service
+MONITORING_DB = 'monitoring.db'
+_conn: Optional[aiosqlite.Connection] = None
+
+async def init_monitoring_db():
+    """Open the monitoring database connection and create the table"""
+    global _conn
+    _conn = await aiosqlite.connect(MONITORING_DB, isolation_level=None)
+    await _conn.execute('PRAGMA journal_mode=WAL')
+    await _conn.execute('PRAGMA synchronous=NORMAL')
+    await _conn.execute('PRAGMA temp_store=MEMORY')
+    await _conn.execute('PRAGMA cache_size=-64000')
+    await _conn.execute('''
         CREATE TABLE IF NOT EXISTS monitored_posts (
             message_id INTEGER,
             channel TEXT,
@@ -106,112 +163,182 @@ def init_monitoring_db():
             PRIMARY KEY (message_id, channel)
         )
     ''')
-    conn.commit()
-    conn.close()
+    await _conn.execute('''
+        CREATE TABLE IF NOT EXISTS channel_cursor (
+            channel TEXT PRIMARY KEY,
+            last_id INTEGER
+        )
+    ''')
+    await _conn.execute('''
+        CREATE TABLE IF NOT EXISTS translations (
+            hash TEXT,
+            lang TEXT,
+            result TEXT,
+            PRIMARY KEY (hash, lang)
+        )
+    ''')
 
-def is_already_monitored(channel: str, message_id: int) -> bool:
+async def is_already_monitored(channel: str, message_id: int) -> bool:
     """Check if post was already processed"""
-    conn = sqlite3.connect('monitoring.db')
-    c = conn.cursor()
-    c.execute('SELECT 1 FROM monitored_posts WHERE channel = ? AND message_id = ?', (channel, message_id))
-    result = c.fetchone()
-    conn.close()
+    async with _conn.execute(
+        'SELECT 1 FROM monitored_posts WHERE channel = ? AND message_id = ?', (channel, message_id)
+    ) as cursor:
+        result = await cursor.fetchone()
     return result is not None
 
-def mark_as_monitored(channel: str, message_id: int, status: str = 'pending'):
+async def mark_as_monitored(channel: str, message_id: int, status: str = 'pending'):
     """Mark post as monitored"""
-    conn = sqlite3.connect('monitoring.db')
-    c = conn.cursor()
-    c.execute(
+    await _conn.execute(
         'INSERT OR REPLACE INTO monitored_posts (channel, message_id, processed_at, status) VALUES (?, ?, ?, ?)',
         (channel, message_id, datetime.now(), status)
     )
-    conn.commit()
-    conn.close()
+
+async def get_channel_cursor(channel: str) -> Optional[int]:
+    """Id of the newest message already fetched from the channel"""
+    async with _conn.execute('SELECT last_id FROM channel_cursor WHERE channel = ?', (channel,)) as cursor:
+        row = await cursor.fetchone()
+    return row[0] if row else None
+
+async def set_channel_cursor(channel: str, last_id: int):
+    """Advance the channel cursor"""
+    await _conn.execute(
+        'INSERT OR REPLACE INTO channel_cursor (channel, last_id) VALUES (?, ?)',
+        (channel, last_id)
+    )
 
 def contains_air_quality_keywords(text: str) -> bool:
     """Check if text contains air quality keywords"""
-    if not text:
-        return False
-    text_lower = text.lower()
-    return any(keyword.lower() in text_lower for keyword in AIR_QUALITY_KEYWORDS)
+    return bool(text and KEYWORD_RE.search(text))
 
 async def translate_text(text: str, dest_lang: str) -> str:
-    """Translate text to target language"""
+    """Translate text to target language, cached in monitoring.db"""
+    text_hash = hashlib.sha1(text.encode('utf-8')).hexdigest()
+    async with _conn.execute(
+        'SELECT result FROM translations WHERE hash = ? AND lang = ?', (text_hash, dest_lang)
+    ) as cursor:
+        row = await cursor.fetchone()
+    if row is not None:
+        return row[0]
+
     try:
         translator = GoogleTranslator(source='auto', target=dest_lang)
-        return translator.translate(text)
+        # translate() is a blocking HTTP call - keep it off the event loop
+        result = await asyncio.to_thread(translator.translate, text)
+        if not result:
+            # Do not cache an empty translation, retry on the next call
+            return text
+        await _conn.execute(
+            'INSERT OR REPLACE INTO translations (hash, lang, result) VALUES (?, ?, ?)',
+            (text_hash, dest_lang, result)
+        )
+        return result
     except Exception as e:
         logger.error(f"Translation error: {e}")
         return text
 
 async def translate_post(text: str) -> Dict[str, str]:
     """Translate post to all 3 languages"""
-    translations = {}
-
-    # Russian
-    translations['ru'] = await translate_text(text, 'ru')
-
-    # Uzbek
-    translations['uz'] = await translate_text(text, 'uz')
-
-    # English
-    translations['en'] = await translate_text(text, 'en')
-
-    return translations
+    # Russian, Uzbek and English are requested concurrently
+    ru, uz, en = await asyncio.gather(
+        translate_text(text, 'ru'),
+        translate_text(text, 'uz'),
+        translate_text(text, 'en')
+    )
+    return {'ru': ru, 'uz': uz, 'en': en}
 
-async def download_post_photo(client, message, output_path: str):
-    """Download photo from message"""
+async def download_post_photo(client, message) -> Optional[io.BytesIO]:
+    """Download photo from message into memory"""
     if message.media and isinstance(message.media, MessageMediaPhoto):
         try:
-            await client.download_media(message.media, output_path)
-            return output_path
+            buf = io.BytesIO()
+            await client.download_media(message.media, buf)
+            buf.seek(0)
+            return buf
         except Exception as e:
             logger.error(f"Failed to download photo: {e}")
             return None
     return None
 
-async def create_preview_page(post_data: Dict[str, Any]) -> str:
-    """Create preview page and return URL"""
-    post_id = post_data['id']
-
-    # Save to Firebase in 'news_preview' collection
-    try:
-        preview_ref = db.collection('news_preview')
-        preview_ref.document(post_id).set({
-            'id': post_id,
-            'channel': post_data['channel'],
-            'date': post_data['date'],
-            'text': post_data['text'],
-            'translations': post_data['translations'],
-            'link': post_data.get('link', ''),
-            'createdAt': firestore.SERVER_TIMESTAMP
-        })
-        logger.info(f"💾 Saved preview to Firebase: {post_id}")
-    except Exception as e:
-        logger.error(f"Failed to save preview to Firebase: {e}")
+async def create_preview_pages(posts: List[Dict[str, Any]]) -> List[str]:
+    """Save previews of several posts in batched commits and return their URLs"""
+    preview_ref = db.collection('news_preview')
+
+    # Save to Firebase in 'news_preview' collection, up to 500 writes per commit
+    batches = []
+    for i in range(0, len(posts), FIRESTORE_BATCH_LIMIT):
+        batch = db.batch()
+        for post_data in posts[i:i + FIRESTORE_BATCH_LIMIT]:
+            batch.set(preview_ref.document(post_data['id']), {
+                'id': post_data['id'],
+                'channel': post_data['channel'],
+                'date': post_data['date'],
+                'text': post_data['text'],
+                'translations': post_data['translations'],
+                'link': post_data.get('link', ''),
+                'createdAt': firestore.SERVER_TIMESTAMP
+            })
+        batches.append(batch)
+
+    # Commits run in parallel on the Firestore pool
+    results = await asyncio.gather(
+        *(run_firestore(batch.commit) for batch in batches),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Failed to save previews to Firebase: {result}")
+    if batches:
+        logger.info(f"💾 Saved {len(posts)} previews to Firebase")
 
     # Return Vercel preview URL (API route - now using ngrok for local dev)
     VERCEL_URL = os.getenv('VERCEL_PREVIEW_URL', 'https://petiolar-mallory-apostolically.ngrok-free.dev')
-    return f'{VERCEL_URL}/api/news/{post_id}'
+    return [f'{VERCEL_URL}/api/news/{post_data["id"]}' for post_data in posts]
+
+async def start_browser():
+    """Launch the shared Chromium instance used for all screenshots"""
+    global playwright, browser
+    playwright = await async_playwright().start()
+    browser = await playwright.chromium.launch()
+
+async def stop_browser():
+    """Close the shared Chromium instance"""
+    if browser is not None:
+        await browser.close()
+    if playwright is not None:
+        await playwright.stop()
 
 async def take_screenshot(url: str, output_path: str):
-    """Take screenshot of webpage"""
+    """Take screenshot of webpage in a fresh context of the shared browser"""
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch()
-            page = await browser.new_page()
-            await page.goto(url)
-            await page.wait_for_load_state('networkidle')
-            await page.screenshot(path=output_path, full_page=True)
-            await browser.close()
+        async with SCREENSHOT_SEM:
+            context = await browser.new_context()
+            try:
+                page = await context.new_page()
+                await page.goto(url)
+                await page.wait_for_load_state('networkidle')
+                await page.screenshot(path=output_path, full_page=True)
+            finally:
+                await context.close()
         return output_path
     except Exception as e:
         logger.error(f"Screenshot error: {e}")
         return None
 
-async def send_to_moderation(post_data: Dict[str, Any], screenshot_path: str, preview_url: str):
-    """Send post to moderation chat"""
+# Markdown special characters escaped in the preview URL
+MD_ESCAPE = str.maketrans({'_': '\\_', '*': '\\*', '[': '\\[', '`': '\\`'})
+
+MODERATION_CAPTION = """
+🆕 **Новость о качестве воздуха**
+
+📍 {channel}
+
+{summary}...
+
+🔗 Полный текст: {url}
+"""
+
+async def send_to_moderation(post_data: Dict[str, Any], photo: Union[str, io.BytesIO, None], preview_url: str):
+    """Send post to moderation chat with a photo file path or in-memory photo"""
     global MODERATION_CHAT_ID
 
     if not MODERATION_CHAT_ID:
@@ -219,37 +346,39 @@ async def send_to_moderation(post_data: Dict[str, Any], screenshot_path: str, pr
         return
 
     # Prepare message (Russian only)
-    # Escape underscores for Markdown
-    escaped_url = preview_url.replace('_', '\\_')
-
-    message_text = f"""
-🆕 **Новость о качестве воздуха**
-
-📍 {post_data['channel']}
-
-{post_data['translations']['ru'][:400]}...
-
-🔗 Полный текст: {escaped_url}
-"""
+    message_text = MODERATION_CAPTION.format(
+        channel=post_data['channel'],
+        summary=post_data['translations']['ru'][:400],
+        url=preview_url.translate(MD_ESCAPE)
+    )
 
     # Buttons
     keyboard = [
-        [InlineKeyboardButton("✅ Запостить", callback_data=f"approve_{post_data['id']}")],
-        [InlineKeyboardButton("❌ Отклонить", callback_data=f"reject_{post_data['id']}")]
+        [InlineKeyboardButton("✅ Запостить", callback_data=CALLBACK_APPROVE + post_data['id'])],
+        [InlineKeyboardButton("❌ Отклонить", callback_data=CALLBACK_REJECT + post_data['id'])]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
     # Send photo (screenshot or original post photo)
     try:
-        if screenshot_path and os.path.exists(screenshot_path):
-            with open(screenshot_path, 'rb') as photo:
+        if isinstance(photo, str):
+            with open(photo, 'rb') as photo_file:
                 await bot.send_photo(
                     chat_id=MODERATION_CHAT_ID,
-                    photo=photo,
+                    photo=photo_file,
                     caption=message_text,
                     reply_markup=reply_markup,
                     parse_mode='Markdown'
                 )
+        elif photo is not None:
+            # Post photo downloaded into memory - uploaded without a /tmp hop
+            await bot.send_photo(
+                chat_id=MODERATION_CHAT_ID,
+                photo=photo,
+                caption=message_text,
+                reply_markup=reply_markup,
+                parse_mode='Markdown'
+            )
         else:
             # Send as text message if no photo
             await bot.send_message(
@@ -262,39 +391,52 @@ async def send_to_moderation(post_data: Dict[str, Any], screenshot_path: str, pr
     except Exception as e:
         logger.error(f"Failed to send to moderation: {e}")
 
-async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle button clicks"""
-    query = update.callback_query
-    await query.answer()
-
-    data = query.data
-    action, post_id = data.split('_', 1)
+async def approve_post(query, post_id: str):
+    """Publish the post and mark the moderation message"""
+    # Save to Firebase
+    await save_to_firebase(post_id)
+    await query.edit_message_caption(
+        caption=query.message.caption + "\n\n✅ **ОПУБЛИКОВАНО**",
+        parse_mode='Markdown'
+    )
+    logger.info(f"✅ Approved and published: {post_id}")
 
-    if action == 'approve':
-        # Save to Firebase
-        await save_to_firebase(post_id)
+async def reject_post(query, post_id: str):
+    """Delete the moderation message and forget the post"""
+    # Delete the message instead of marking
+    try:
+        await query.message.delete()
+        logger.info(f"🗑️ Deleted rejected post: {post_id}")
+    except Exception as e:
+        logger.error(f"Failed to delete message: {e}")
+        # Fallback - mark as rejected
         await query.edit_message_caption(
-            caption=query.message.caption + "\n\n✅ **ОПУБЛИКОВАНО**",
+            caption=query.message.caption + "\n\n❌ **ОТКЛОНЕНО**",
             parse_mode='Markdown'
         )
-        logger.info(f"✅ Approved and published: {post_id}")
 
-    elif action == 'reject':
-        # Delete the message instead of marking
-        try:
-            await query.message.delete()
-            logger.info(f"🗑️ Deleted rejected post: {post_id}")
-        except Exception as e:
-            logger.error(f"Failed to delete message: {e}")
-            # Fallback - mark as rejected
-            await query.edit_message_caption(
-                caption=query.message.caption + "\n\n❌ **ОТКЛОНЕНО**",
-                parse_mode='Markdown'
-            )
+    # Clean up pending posts
+    pending_posts.pop(post_id, None)
 
-        # Clean up pending posts
-        if post_id in pending_posts:
-            del pending_posts[post_id]
+# callback_data is a one-character action followed by the post id
+CALLBACK_APPROVE = 'A'
+CALLBACK_REJECT = 'R'
+CALLBACK_ACTIONS = {
+    CALLBACK_APPROVE: approve_post,
+    CALLBACK_REJECT: reject_post,
+}
+
+async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle button clicks"""
+    query = update.callback_query
+    await query.answer()
+
+    data = query.data
+    handler = CALLBACK_ACTIONS.get(data[:1])
+    if handler is None:
+        logger.warning(f"Unknown callback data: {data}")
+        return
+    await handler(query, data[1:])
 
 async def save_to_firebase(post_id: str):
     """Save approved post to Firebase"""
@@ -319,12 +461,20 @@ async def save_to_firebase(post_id: str):
         'createdAt': firestore.SERVER_TIMESTAMP
     }
 
-    news_ref.document(post_id).set(news_doc)
+    await run_firestore(news_ref.document(post_id).set, news_doc)
     logger.info(f"✅ Saved to Firebase: {post_id}")
 
     # Clean up
     del pending_posts[post_id]
 
+def _delete_batch(refs) -> int:
+    """Delete documents in one batch commit, return how many were deleted"""
+    batch = db.batch()
+    for ref in refs:
+        batch.delete(ref)
+    batch.commit()
+    return len(refs)
+
 async def delete_old_news():
     """Delete news older than 7 days"""
     seven_days_ago = datetime.now() - timedelta(days=7)
@@ -332,93 +482,153 @@ async def delete_old_news():
     news_ref = db.collection('news')
     old_news = news_ref.where(
         filter=FieldFilter('createdAt', '<', seven_days_ago)
-    ).stream()
+    )
+    refs = await run_firestore(lambda: [doc.reference for doc in old_news.stream()])
 
+    # Delete in batches of up to 500 documents per commit, committed in parallel
+    commits = [
+        run_firestore(_delete_batch, refs[i:i + FIRESTORE_BATCH_LIMIT])
+        for i in range(0, len(refs), FIRESTORE_BATCH_LIMIT)
+    ]
     count = 0
-    for doc in old_news:
-        doc.reference.delete()
-        count += 1
+    for commit in asyncio.as_completed(commits):
+        count += await commit
 
     if count > 0:
         logger.info(f"🗑️  Deleted {count} old news posts")
 
-async def monitor_channels():
-    """Monitor channels for new air quality posts"""
-    logger.info("🔄 Starting monitoring cycle...")
+async def moderate_post(post_data: Dict[str, Any], preview_url: str):
+    """Send the post to moderation with its photo, or a screenshot of the preview page"""
+    post_id = post_data['id']
 
-    await tg_client.start()
+    # The post's own photo is shown as is, no need to render the preview page
+    photo = post_data.pop('photo_buf', None) or post_data.get('photo')
+    if photo is None:
+        # Take screenshot (optional - send as text if it fails)
+        photo = await take_screenshot(preview_url, f'/tmp/{post_id}_screenshot.png')
 
-    new_posts_count = 0
+    # Store in pending
+    add_pending_post(post_id, post_data)
 
-    for channel in CHANNELS:
-        channel = channel.strip()
-        if not channel:
-            continue
+    # Send to moderation
+    await send_to_moderation(post_data, photo, preview_url)
 
-        try:
-            # Get last 5 messages (last 3 hours)
-            messages = await tg_client.get_messages(channel, limit=5)
+async def _prepare_post(channel: str, msg) -> Dict[str, Any]:
+    """Translated post data (with its photo) for the moderation message"""
+    logger.info(f"📰 New post found: {channel}/{msg.id}")
 
-            for msg in messages:
-                if not msg.message:
-                    continue
+    # Create post data
+    post_id = f"{channel.replace('@', '')}_{msg.id}_{int(datetime.now().timestamp())}"
 
-                # Check if already processed
-                if is_already_monitored(channel, msg.id):
-                    continue
+    # Translate
+    translations = await translate_post(msg.message)
 
-                # Check if contains air quality keywords
-                if not contains_air_quality_keywords(msg.message):
-                    continue
+    post_data = {
+        'id': post_id,
+        'channel': channel,
+        'message_id': msg.id,
+        'date': msg.date.isoformat(),
+        'text': msg.message,
+        'translations': translations,
+        'link': f'https://t.me/{channel.replace("@", "")}/{msg.id}'
+    }
 
-                logger.info(f"📰 New post found: {channel}/{msg.id}")
+    # Download photo if exists
+    if msg.media:
+        photo_buf = await download_post_photo(tg_client, msg)
+        if photo_buf is not None:
+            post_data['photo_buf'] = photo_buf
 
-                # Create post data
-                post_id = f"{channel.replace('@', '')}_{msg.id}_{int(datetime.now().timestamp())}"
+    return post_data
 
-                # Translate
-                translations = await translate_post(msg.message)
 
-                post_data = {
-                    'id': post_id,
-                    'channel': channel,
-                    'message_id': msg.id,
-                    'date': msg.date.isoformat(),
-                    'text': msg.message,
-                    'translations': translations,
-                    'link': f'https://t.me/{channel.replace("@", "")}/{msg.id}'
-                }
+async def _process_channel(channel: str) -> int:
+    """Check one channel for new air quality posts, return how many were sent"""
+    new_posts_count = 0
 
-                # Download photo if exists
-                if msg.media:
-                    photo_path = f'/tmp/{post_id}.jpg'
-                    await download_post_photo(tg_client, msg, photo_path)
-                    post_data['photo'] = photo_path
+    try:
+        last_id = await get_channel_cursor(channel)
+        if last_id is None:
+            # First run for this channel - start from the last 5 messages
+            messages = await tg_client.get_messages(channel, limit=5)
+        else:
+            # Only messages newer than the cursor, filtered by Telegram
+            messages = [
+                msg async for msg in tg_client.iter_messages(channel, min_id=last_id, reverse=True, limit=CURSOR_FETCH_LIMIT)
+            ]
+        # Oldest first, so a failure leaves the cursor just below the failed post
+        messages = sorted(messages, key=lambda msg: msg.id)
+        failed_id = None
+
+        new_posts = []
+        for msg in messages:
+            if not msg.message:
+                continue
 
-                # Create preview page
-                preview_url = await create_preview_page(post_data)
+            # Check if contains air quality keywords
+            if not contains_air_quality_keywords(msg.message):
+                continue
 
-                # Take screenshot (optional - skip if fails)
-                screenshot_path = f'/tmp/{post_id}_screenshot.png'
-                screenshot_result = await take_screenshot(preview_url, screenshot_path)
+            # Posts retried after a failure (or seen by an earlier version) may already be sent
+            if await is_already_monitored(channel, msg.id):
+                continue
 
-                # If screenshot failed, send without it (send photo from post instead)
-                if not screenshot_result and msg.media:
-                    screenshot_path = post_data.get('photo', None)
+            try:
+                post_data = await _prepare_post(channel, msg)
+            except Exception as e:
+                logger.error(f"Error preparing {channel}/{msg.id}: {e}")
+                failed_id = msg.id
+                break
 
-                # Store in pending
-                pending_posts[post_id] = post_data
+            new_posts.append((msg, post_data))
 
-                # Send to moderation
-                await send_to_moderation(post_data, screenshot_path, preview_url)
+        # Create preview pages in one Firestore commit
+        preview_urls = await create_preview_pages([post_data for _, post_data in new_posts])
 
-                # Mark as monitored
-                mark_as_monitored(channel, msg.id, 'pending')
+        # Screenshot and send all posts concurrently
+        results = await asyncio.gather(
+            *(moderate_post(post_data, preview_url) for (_, post_data), preview_url in zip(new_posts, preview_urls)),
+            return_exceptions=True
+        )
 
-                new_posts_count += 1
+        for (msg, post_data), result in zip(new_posts, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error sending {post_data['id']} to moderation: {result}")
+                failed_id = msg.id if failed_id is None else min(failed_id, msg.id)
+                continue
 
-        except Exception as e:
-            logger.error(f"Error monitoring {channel}: {e}")
+            # Mark as monitored
+            await mark_as_monitored(channel, msg.id, 'pending')
+
+            new_posts_count += 1
+
+        # Advance the cursor only over messages handled without error; failed ones are retried
+        handled_ids = [msg.id for msg in messages if failed_id is None or msg.id < failed_id]
+        if handled_ids:
+            await set_channel_cursor(channel, max(handled_ids))
+
+    except Exception as e:
+        logger.error(f"Error monitoring {channel}: {e}")
+
+    return new_posts_count
+
+
+async def monitor_channels():
+    """Monitor channels for new air quality posts"""
+    logger.info("🔄 Starting monitoring cycle...")
+
+    # Channels are checked concurrently over the one Telethon connection
+    channels = [c.strip() for c in CHANNELS if c.strip()]
+    results = await asyncio.gather(
+        *(_process_channel(channel) for channel in channels),
+        return_exceptions=True
+    )
+    new_posts_count = 0
+    for channel, result in zip(channels, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error monitoring {channel}: {result}")
+        else:
+            new_posts_count += result
 
     # If no posts found in Telegram channels, fallback to web search
     if new_posts_count == 0:
@@ -427,8 +637,6 @@ async def monitor_channels():
 
     logger.info(f"✅ Monitoring cycle complete. Found {new_posts_count} new posts")
 
-    await tg_client.disconnect()
-
 
 async def process_web_search_news():
     """Search web for air quality news and send to moderation"""
@@ -441,6 +649,7 @@ async def process_web_search_news():
 
         logger.info(f"🌐 Found {len(web_news)} news from web search")
 
+        web_posts = []
         for news in web_news:
             try:
                 post_id = news['id']
@@ -464,29 +673,27 @@ async def process_web_search_news():
                 if news.get('photo_path'):
                     post_data['photo'] = news['photo_path']
 
-                # Create preview page
-                preview_url = await create_preview_page(post_data)
-
-                # Take screenshot
-                screenshot_path = f'/tmp/{post_id}_screenshot.png'
-                screenshot_result = await take_screenshot(preview_url, screenshot_path)
-
-                # If screenshot failed, use the downloaded photo
-                if not screenshot_result and news.get('photo_path'):
-                    screenshot_path = news['photo_path']
-
-                # Store in pending
-                pending_posts[post_id] = post_data
-
-                # Send to moderation
-                await send_to_moderation(post_data, screenshot_path, preview_url)
-
-                logger.info(f"✅ Sent web search news to moderation: {post_id}")
+                web_posts.append(post_data)
 
             except Exception as e:
                 logger.error(f"Error processing web search news item: {e}")
                 continue
 
+        # Create preview pages in one Firestore commit
+        preview_urls = await create_preview_pages(web_posts)
+
+        # Screenshot and send all news concurrently
+        results = await asyncio.gather(
+            *(moderate_post(post_data, preview_url) for post_data, preview_url in zip(web_posts, preview_urls)),
+            return_exceptions=True
+        )
+
+        for post_data, result in zip(web_posts, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error processing web search news item: {result}")
+            else:
+                logger.info(f"✅ Sent web search news to moderation: {post_data['id']}")
+
     except Exception as e:
         logger.error(f"Web search failed: {e}")
 
@@ -495,7 +702,11 @@ async def main():
     logger.info("🚀 Starting Air Quality News Monitoring Service")
 
     # Initialize
-    init_monitoring_db()
+    await init_monitoring_db()
+    await start_browser()
+
+    # One Telegram connection for the service lifetime
+    await tg_client.start()
 
     # Setup bot handlers
     application = Application.builder().token(BOT_TOKEN).build()
@@ -514,6 +725,17 @@ async def main():
     # Clean old news daily
     scheduler.add_job(delete_old_news, 'cron', hour=0, minute=0)
 
+    # Install SIGINT/SIGTERM handlers before the first (long) cycle so a stop
+    # request during it still goes through the cleanup below
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows has no loop signal handlers; Ctrl+C raises KeyboardInterrupt
+            pass
+
     # Run first monitoring immediately
     await monitor_channels()
 
@@ -524,15 +746,20 @@ async def main():
     logger.info("📊 Monitoring every 3 hours")
     logger.info("🗑️  Cleaning old news daily at midnight")
 
-    # Keep running
+    # Keep running until stopped, without waking the loop while idle
     try:
-        while True:
-            await asyncio.sleep(1)
+        await stop.wait()
     except KeyboardInterrupt:
-        logger.info("🛑 Shutting down...")
-        scheduler.shutdown()
-        await application.stop()
-        await application.shutdown()
+        pass
+
+    logger.info("🛑 Shutting down...")
+    scheduler.shutdown()
+    await application.stop()
+    await application.shutdown()
+    await stop_browser()
+    await tg_client.disconnect()
+    await close_web_search_agent()
+    await _conn.close()
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -12,7 +12,7 @@ import asyncio
 import uuid
 import logging
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional, Tuple
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -57,6 +57,9 @@ if not firebase_admin._apps:
 
 db = firestore.client()
 
+# Telethon client, connected once for the bot's lifetime
+tg_client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
+
 # Store pending news temporarily (news_id -> news_data)
 pending_news = {}
 
@@ -79,6 +82,28 @@ def get_tag_from_channel(channel: str) -> str:
     return channel_tags.get(channel, 'Global')
 
 
+async def fetch_candidates(channel: str) -> List[Tuple[str, int, str]]:
+    """Recent posts of a channel long enough to analyze, as (channel, message_id, text)"""
+    candidates = []
+    try:
+        logger.info(f"Checking {channel}...")
+
+        async for message in tg_client.iter_messages(channel, limit=10):
+            if not isinstance(message, Message):
+                continue
+
+            text = message.text or ""
+            if len(text) < 50:
+                continue
+
+            candidates.append((channel, message.id, text))
+
+    except Exception as e:
+        logger.error(f"Channel {channel} error: {e}")
+
+    return candidates
+
+
 async def search_news(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Search for air quality news in channels"""
     user_id = update.effective_user.id
@@ -93,119 +118,105 @@ async def search_news(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='Markdown'
     )
 
-    # Initialize Telethon client
-    tg_client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
-    await tg_client.start()
-
-    try:
-        agent = get_agent()
-        found_news = []
+    agent = get_agent()
 
-        for channel in CHANNELS_TO_MONITOR:
-            try:
-                logger.info(f"Checking {channel}...")
+    # Read all channels concurrently
+    per_channel = await asyncio.gather(*(fetch_candidates(channel) for channel in CHANNELS_TO_MONITOR))
+    candidates = [candidate for channel_candidates in per_channel for candidate in channel_candidates]
 
-                async for message in tg_client.iter_messages(channel, limit=10):
-                    if not isinstance(message, Message):
-                        continue
+    # Classify the candidates in bounded batches, then rephrase the relevant ones concurrently
+    found_news = []
+    try:
+        analyses = await agent.is_air_quality_news_batch([text for _, _, text in candidates])
+        relevant = [
+            (candidate, analysis) for candidate, analysis in zip(candidates, analyses)
+            if analysis.get('is_air_quality_news') and analysis.get('confidence', 0) >= MIN_CONFIDENCE
+        ]
+        rephrased_texts = await asyncio.gather(
+            *(agent.rephrase_news(text) for (_, _, text), _ in relevant)
+        )
 
-                    text = message.text or ""
-                    if len(text) < 50:
-                        continue
+        for ((channel, message_id, text), analysis), rephrased in zip(relevant, rephrased_texts):
+            logger.info(f"Found relevant post in {channel}")
+            found_news.append({
+                'channel': channel,
+                'original': text,
+                'rephrased': rephrased or text,
+                'confidence': analysis.get('confidence', 0),
+                'message_id': message_id
+            })
 
-                    try:
-                        analysis = agent.is_air_quality_news(text)
+    except Exception as e:
+        logger.error(f"Analysis error: {e}")
 
-                        if analysis.get('is_air_quality_news') and analysis.get('confidence', 0) >= MIN_CONFIDENCE:
-                            logger.info(f"Found relevant post in {channel}")
+    if not found_news:
+        await update.message.reply_text(
+            "❌ *Результат*\n\n"
+            "Не найдено релевантных новостей о качестве воздуха за последние 48 часов.",
+            parse_mode='Markdown'
+        )
+        return
 
-                            # Rephrase the news
-                            rephrased = agent.rephrase_news(text)
+    await update.message.reply_text(
+        f"✅ *Найдено {len(found_news)} новостей!*\n\n"
+        "Отправляю каждую для проверки...",
+        parse_mode='Markdown'
+    )
 
-                            found_news.append({
-                                'channel': channel,
-                                'original': text,
-                                'rephrased': rephrased or text,
-                                'confidence': analysis.get('confidence', 0),
-                                'message_id': message.id
-                            })
+    # Send each news with inline buttons
+    for i, news in enumerate(found_news):
+        news_id = generate_news_id()
 
-                    except Exception as e:
-                        logger.error(f"Analysis error: {e}")
-                        continue
+        # Generate translations
+        ru_text = news['rephrased']
+        logger.info(f"Translating news {news_id} to Uzbek and English...")
+        uz_text, en_text = await asyncio.gather(
+            agent.translate_text(ru_text, 'uz'),
+            agent.translate_text(ru_text, 'en')
+        )
+        uz_text = uz_text or ''
+        en_text = en_text or ''
 
-            except Exception as e:
-                logger.error(f"Channel {channel} error: {e}")
-                continue
+        # Store pending news with translations
+        pending_news[news_id] = {
+            'id': news_id,
+            'channel': news['channel'],
+            'text_ru': ru_text,
+            'text_uz': uz_text,
+            'text_en': en_text,
+            'original': news['original'][:500],
+            'confidence': news['confidence'],
+            'tag': get_tag_from_channel(news['channel']),
+        }
 
-        if not found_news:
-            await update.message.reply_text(
-                "❌ *Результат*\n\n"
-                "Не найдено релевантных новостей о качестве воздуха за последние 48 часов.",
-                parse_mode='Markdown'
-            )
-            return
+        # Create inline keyboard
+        keyboard = [
+            [
+                InlineKeyboardButton("✅ Опубликовать", callback_data=f"publish_{news_id}"),
+                InlineKeyboardButton("❌ Отклонить", callback_data=f"reject_{news_id}")
+            ]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+
+        # Format message
+        message_text = (
+            f"📰 *Новость #{i+1}*\n"
+            f"📢 Источник: {news['channel']}\n"
+            f"📊 Уверенность: {news['confidence']:.0%}\n"
+            f"🏷 Тег: {pending_news[news_id]['tag']}\n\n"
+            f"*Текст (RU):*\n{ru_text[:500]}{'...' if len(ru_text) > 500 else ''}\n\n"
+            f"*Текст (UZ):*\n{uz_text[:300]}{'...' if len(uz_text) > 300 else ''}"
+        )
 
         await update.message.reply_text(
-            f"✅ *Найдено {len(found_news)} новостей!*\n\n"
-            "Отправляю каждую для проверки...",
-            parse_mode='Markdown'
+            message_text,
+            parse_mode='Markdown',
+            reply_markup=reply_markup
         )
 
-        # Send each news with inline buttons
-        for i, news in enumerate(found_news):
-            news_id = generate_news_id()
-
-            # Generate translations
-            ru_text = news['rephrased']
-            logger.info(f"Translating news {news_id} to Uzbek...")
-            uz_text = agent.translate_text(ru_text, 'uz') or ''
-            logger.info(f"Translating news {news_id} to English...")
-            en_text = agent.translate_text(ru_text, 'en') or ''
-
-            # Store pending news with translations
-            pending_news[news_id] = {
-                'id': news_id,
-                'channel': news['channel'],
-                'text_ru': ru_text,
-                'text_uz': uz_text,
-                'text_en': en_text,
-                'original': news['original'][:500],
-                'confidence': news['confidence'],
-                'tag': get_tag_from_channel(news['channel']),
-            }
-
-            # Create inline keyboard
-            keyboard = [
-                [
-                    InlineKeyboardButton("✅ Опубликовать", callback_data=f"publish_{news_id}"),
-                    InlineKeyboardButton("❌ Отклонить", callback_data=f"reject_{news_id}")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+        await asyncio.sleep(1)  # Avoid rate limiting
 
-            # Format message
-            message_text = (
-                f"📰 *Новость #{i+1}*\n"
-                f"📢 Источник: {news['channel']}\n"
-                f"📊 Уверенность: {news['confidence']:.0%}\n"
-                f"🏷 Тег: {pending_news[news_id]['tag']}\n\n"
-                f"*Текст (RU):*\n{ru_text[:500]}{'...' if len(ru_text) > 500 else ''}\n\n"
-                f"*Текст (UZ):*\n{uz_text[:300]}{'...' if len(uz_text) > 300 else ''}"
-            )
-
-            await update.message.reply_text(
-                message_text,
-                parse_mode='Markdown',
-                reply_markup=reply_markup
-            )
-
-            await asyncio.sleep(1)  # Avoid rate limiting
-
-        logger.info(f"Sent {len(found_news)} news for review")
-
-    finally:
-        await tg_client.disconnect()
+    logger.info(f"Sent {len(found_news)} news for review")
 
 
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -332,12 +343,28 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+async def connect_telethon(application: Application):
+    """Connect the shared Telethon client when the bot starts"""
+    await tg_client.start()
+
+
+async def disconnect_telethon(application: Application):
+    """Disconnect the shared Telethon client when the bot stops"""
+    await tg_client.disconnect()
+
+
 def main():
     """Run the bot"""
     logger.info("Starting Musaffo News Bot...")
 
     # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(connect_telethon)
+        .post_shutdown(disconnect_telethon)
+        .build()
+    )
 
     # Add handlers
     application.add_handler(CommandHandler("start", start))
@@ -0,0 +1,129 @@
+"""
+Shared scan -> classify -> rephrase pipeline of the one-off send scripts
+Each script only decides how the found news is delivered
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from telethon import TelegramClient
+from telethon.sessions import StringSession
+
+from air_quality_agent import get_agent, may_be_air_quality_news
+from cache import NewsCache, post_key
+from post_dedup import PostDeduplicator
+
+logger = logging.getLogger(__name__)
+
+# Telethon credentials (user account reading the channels)
+API_ID = int(os.getenv('TELEGRAM_API_ID', '0'))
+API_HASH = os.getenv('TELEGRAM_API_HASH', '')
+SESSION_NAME = 'air_quality_bot'
+# Optional StringSession export; when set, no SQLite session file is used
+TELEGRAM_STRING_SESSION = os.getenv('TELEGRAM_STRING_SESSION', '')
+
+# Channels read at the same time; more risks Telegram flood waits
+CHANNEL_SCAN_SEM = asyncio.Semaphore(4)
+
+
+def create_tg_client() -> TelegramClient:
+    """Client on the in-memory StringSession if one is configured, else on the session file"""
+    if TELEGRAM_STRING_SESSION:
+        return TelegramClient(StringSession(TELEGRAM_STRING_SESSION), API_ID, API_HASH)
+    return TelegramClient(SESSION_NAME, API_ID, API_HASH)
+
+
+async def scan_channel(client: TelegramClient, channel: str, cutoff_time: datetime) -> List[Dict[str, Any]]:
+    """Posts of one channel newer than cutoff_time that are worth classifying"""
+    posts = []
+    async with CHANNEL_SCAN_SEM:
+        try:
+            logger.info(f"Checking {channel}...")
+
+            async for message in client.iter_messages(channel, limit=30):
+                # Cheap checks on the raw text first; .text renders the
+                # message entities as markdown, so it is built only for keepers
+                raw = message.message
+                if not raw or len(raw.strip()) < 50:
+                    continue
+
+                # Only posts mentioning air quality terms go to the LLM
+                if not may_be_air_quality_news(raw):
+                    continue
+
+                if message.date < cutoff_time:
+                    break
+
+                posts.append({
+                    'channel': channel,
+                    'message_id': message.id,
+                    'text': message.text,
+                    'message': message  # Keep original message for photo
+                })
+
+        except Exception as e:
+            logger.error(f"Channel {channel} error: {e}")
+
+    return posts
+
+
+async def scan_candidates(client: TelegramClient, channels: List[str], hours_back: int = 48) -> List[Dict[str, Any]]:
+    """Recent candidate posts of all channels without duplicates, reading the channels concurrently"""
+    # Telethon dates are aware UTC, so they compare without conversion
+    cutoff_time = datetime.now(timezone.utc) - timedelta(hours=hours_back)
+    channels = [channel.strip() for channel in channels if channel.strip()]
+
+    per_channel = await asyncio.gather(*(scan_channel(client, channel, cutoff_time) for channel in channels))
+
+    # Channels cross-post the same story; classify only its first copy
+    dedup = PostDeduplicator()
+    posts = [post for channel_posts in per_channel for post in channel_posts if not dedup.is_duplicate(post['text'])]
+    logger.info(f"{len(posts)} candidate posts after dropping cross-posted duplicates")
+    return posts
+
+
+async def find_news(posts: List[Dict[str, Any]], min_confidence: float) -> List[Dict[str, Any]]:
+    """
+    Classify posts in batches and rephrase the relevant ones concurrently
+    Verdicts and rephrasings are reused from news_cache.db on reruns
+    """
+    agent = get_agent()
+    news_cache = NewsCache()
+    try:
+        keys = [post_key(post['channel'], post['message_id']) for post in posts]
+        try:
+            analyses = await news_cache.classify(agent, list(zip(keys, (post['text'] for post in posts))))
+        except Exception as e:
+            logger.error(f"Analysis error: {e}")
+            return []
+
+        relevant = [
+            (key, post, analysis) for key, post, analysis in zip(keys, posts, analyses)
+            if analysis.get('is_air_quality_news') and analysis.get('confidence', 0) >= min_confidence
+        ]
+        rephrased_texts = await asyncio.gather(
+            *(news_cache.rephrase(agent, key, post['text']) for key, post, _ in relevant),
+            return_exceptions=True
+        )
+    finally:
+        news_cache.close()
+
+    found_news = []
+    for (_, post, analysis), rephrased in zip(relevant, rephrased_texts):
+        if isinstance(rephrased, Exception):
+            logger.error(f"Rephrase error: {rephrased}")
+            rephrased = None
+
+        logger.info(f"Found relevant post in {post['channel']}")
+        found_news.append({
+            'channel': post['channel'],
+            'message_id': post['message_id'],
+            'message': post['message'],
+            'original': post['text'],
+            'rephrased': rephrased or post['text'],
+            'confidence': analysis.get('confidence', 0),
+        })
+    return found_news
@@ -0,0 +1,66 @@
+"""
+Near-duplicate detection for posts within one monitoring cycle
+Channels often repost the same bulletin; only the first copy is sent to Bedrock
+"""
+
+import hashlib
+import re
+from collections import Counter
+from typing import Dict, List, Set
+
+_WORD_RE = re.compile(r"\w+")
+
+SIMHASH_BITS = 64
+# Fingerprints within MAX_HAMMING bits are near-duplicates. With
+# MAX_HAMMING + 1 bands at least one band matches exactly, so the band
+# index finds every candidate.
+MAX_HAMMING = 3
+SIMHASH_BANDS = MAX_HAMMING + 1
+_BAND_WIDTH = SIMHASH_BITS // SIMHASH_BANDS
+_BAND_MASK = (1 << _BAND_WIDTH) - 1
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(words: List[str]) -> int:
+    """64-bit SimHash over words and word bigrams"""
+    features = Counter(words)
+    features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    weights = [0] * SIMHASH_BITS
+    for feature, count in features.items():
+        h = _hash64(feature)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if h >> bit & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+class PostDeduplicator:
+    """Remembers texts seen in a cycle and flags exact and near-duplicate reposts"""
+
+    def __init__(self):
+        self._exact: Set[int] = set()
+        # band index -> band value -> fingerprints
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(SIMHASH_BANDS)]
+
+    def is_duplicate(self, text: str) -> bool:
+        """Return True if a (near-)identical text was seen, otherwise remember this one"""
+        words = _WORD_RE.findall(text.lower())
+        key = _hash64("".join(words))
+        if key in self._exact:
+            return True
+
+        fingerprint = simhash(words)
+        band_values = [
+            fingerprint >> (band * _BAND_WIDTH) & _BAND_MASK for band in range(SIMHASH_BANDS)
+        ]
+        for band, value in enumerate(band_values):
+            for other in self._bands[band].get(value, ()):
+                if (fingerprint ^ other).bit_count() <= MAX_HAMMING:
+                    return True
+
+        self._exact.add(key)
+        for band, value in enumerate(band_values):
+            self._bands[band].setdefault(value, []).append(fingerprint)
+        return False
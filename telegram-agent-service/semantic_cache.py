@@ -0,0 +1,75 @@
+"""
+Semantic cache for LLM verdicts
+Reuses a cached result for near-duplicate texts (reposts with small edits)
+instead of calling Bedrock again
+"""
+
+import math
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _embed(text: str) -> Dict[str, float]:
+    """L2-normalized character trigram vector of the normalized text"""
+    normalized = " ".join(_WORD_RE.findall(text.lower()))
+    counts = Counter(normalized[i:i + 3] for i in range(len(normalized) - 2))
+    norm = math.sqrt(sum(c * c for c in counts.values()))
+    if not norm:
+        return {}
+    return {gram: c / norm for gram, c in counts.items()}
+
+
+def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(gram, 0.0) for gram, weight in a.items())
+
+
+class SemanticCache:
+    """In-memory nearest-neighbour cache keyed by text similarity"""
+
+    def __init__(self, threshold: float = 0.92, ttl_seconds: int = 7 * 24 * 3600, max_entries: int = 5000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # namespace -> [(stored_at, vector, value)], oldest first
+        self._entries: Dict[str, List[Tuple[float, Dict[str, float], Any]]] = {}
+
+    def _live_entries(self, namespace: str) -> List[Tuple[float, Dict[str, float], Any]]:
+        entries = self._entries.setdefault(namespace, [])
+        cutoff = time.time() - self.ttl_seconds
+        expired = 0
+        while expired < len(entries) and entries[expired][0] < cutoff:
+            expired += 1
+        if expired:
+            del entries[:expired]
+        return entries
+
+    def get(self, text: str, namespace: str = "default") -> Optional[Any]:
+        """Return the value stored for the most similar text above the threshold"""
+        vector = _embed(text)
+        if not vector:
+            return None
+
+        best_value = None
+        best_similarity = self.threshold
+        for _, other, value in self._live_entries(namespace):
+            similarity = _cosine(vector, other)
+            if similarity >= best_similarity:
+                best_similarity = similarity
+                best_value = value
+        return best_value
+
+    def put(self, text: str, value: Any, namespace: str = "default"):
+        vector = _embed(text)
+        if not vector:
+            return
+
+        entries = self._live_entries(namespace)
+        entries.append((time.time(), vector, value))
+        if len(entries) > self.max_entries:
+            del entries[:len(entries) - self.max_entries]
@@ -2,34 +2,32 @@
 Quick script to send found air quality news to user
 """
 
-import os
 import asyncio
-from datetime import datetime, timedelta
 import logging
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from telethon import TelegramClient
-from telethon.tl.types import Message
+from aiolimiter import AsyncLimiter
 
-from air_quality_agent import get_agent
+from air_quality_agent import close_agent
+from pipeline import create_tg_client, find_news, scan_candidates
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-API_ID = int(os.getenv('TELEGRAM_API_ID', '0'))
-API_HASH = os.getenv('TELEGRAM_API_HASH', '')
-SESSION_NAME = 'air_quality_bot'
 TARGET_USER_ID = 832620295
 CHANNELS_TO_MONITOR = ['@kunuzofficial', '@uza_uz', '@Daryo', '@zamonuz']
 MIN_CONFIDENCE = 0.6
 
+# Telegram allows about 1 message/s to the same chat
+SEND_LIMITER = AsyncLimiter(1, 1)
+
 
 async def main():
     logger.info("Starting...")
 
-    client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
+    client = create_tg_client()
     await client.start()
 
     try:
@@ -43,59 +41,31 @@ async def main():
             "Ищу релевантные новости за последние 48 часов..."
         )
 
-        agent = get_agent()
-        relevant_count = 0
-        cutoff_time = datetime.now() - timedelta(hours=48)
+        posts = await scan_candidates(client, CHANNELS_TO_MONITOR, hours_back=48)
+        found_news = await find_news(posts, MIN_CONFIDENCE)
 
-        for channel in CHANNELS_TO_MONITOR:
+        relevant_count = 0
+        for news in found_news:
             try:
-                logger.info(f"Checking {channel}...")
-
-                async for message in client.iter_messages(channel, limit=30):
-                    if not isinstance(message, Message):
-                        continue
-
-                    if message.date.replace(tzinfo=None) < cutoff_time:
-                        break
-
-                    text = message.text or ""
-                    if len(text) < 50:
-                        continue
-
-                    # Analyze
-                    try:
-                        analysis = agent.is_air_quality_news(text)
-
-                        if analysis.get('is_air_quality_news') and analysis.get('confidence', 0) >= MIN_CONFIDENCE:
-                            logger.info(f"Found relevant post in {channel}")
-
-                            # Rephrase
-                            rephrased = agent.rephrase_news(text)
-
-                            # Send immediately
-                            msg_text = (
-                                f"📰 **Новость #{relevant_count + 1}**\n"
-                                f"📢 Источник: {channel}\n"
-                                f"📊 Уверенность: {analysis.get('confidence', 0):.0%}\n\n"
-                                f"**Текст для публикации:**\n{rephrased or text[:500]}\n\n"
-                                f"---\n"
-                                f"_Оригинал:_ {text[:300]}..."
-                            )
-
-                            if message.photo:
-                                await client.send_file(user, message.photo, caption=msg_text[:1024])
-                            else:
-                                await client.send_message(user, msg_text)
-
-                            relevant_count += 1
-                            await asyncio.sleep(2)
-
-                    except Exception as e:
-                        logger.error(f"Analysis error: {e}")
-                        continue
+                msg_text = (
+                    f"📰 **Новость #{relevant_count + 1}**\n"
+                    f"📢 Источник: {news['channel']}\n"
+                    f"📊 Уверенность: {news['confidence']:.0%}\n\n"
+                    f"**Текст для публикации:**\n{news['rephrased']}\n\n"
+                    f"---\n"
+                    f"_Оригинал:_ {news['original'][:300]}..."
+                )
+
+                async with SEND_LIMITER:
+                    if news['message'].photo:
+                        await client.send_file(user, news['message'].photo, caption=msg_text[:1024])
+                    else:
+                        await client.send_message(user, msg_text)
+
+                relevant_count += 1
 
             except Exception as e:
-                logger.error(f"Channel {channel} error: {e}")
+                logger.error(f"Send error: {e}")
                 continue
 
         # Final message
@@ -111,6 +81,7 @@ async def main():
 
     finally:
         await client.disconnect()
+        await close_agent()
 
 
 if __name__ == "__main__":
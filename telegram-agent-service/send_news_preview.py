@@ -7,40 +7,45 @@ Send air quality news via Telegram Bot with news-preview links
 
 import os
 import asyncio
-import uuid
-from datetime import datetime, timedelta
+import secrets
 import logging
+from typing import List, Optional
 import httpx
+from aiolimiter import AsyncLimiter
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from telethon import TelegramClient
-from telethon.tl.types import Message
-
 import firebase_admin
 from firebase_admin import credentials, firestore
 
-from air_quality_agent import get_agent
+from air_quality_agent import close_agent, get_agent
+from pipeline import create_tg_client, find_news, scan_candidates
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Telethon for reading channels
-API_ID = int(os.getenv('TELEGRAM_API_ID', '0'))
-API_HASH = os.getenv('TELEGRAM_API_HASH', '')
-SESSION_NAME = 'air_quality_bot'
-
 # Bot for sending messages
-BOT_TOKEN = '8333357201:AAFc4DBdgbbxH_mT4wJMZ8ieLGY_s3Zg0x8'
+BOT_TOKEN = os.getenv('NEWS_BOT_TOKEN', '')
 TARGET_USER_ID = 832620295
 
+# Bot API client, opened in main() and reused for every request
+http_client: Optional[httpx.AsyncClient] = None
+
 # News preview URL
 NEWS_PREVIEW_URL = "https://news-preview-rho.vercel.app/api/news"
 
 CHANNELS_TO_MONITOR = ['@kunuzofficial', '@uza_uz', '@Daryo', '@zamonuz']
 MIN_CONFIDENCE = 0.6
 
+# Firestore allows at most 500 writes per batch
+FIRESTORE_BATCH_LIMIT = 500
+
+# Bot API limits: 30 messages/s overall, 1 message/s to the same chat
+BOT_API_LIMITER = AsyncLimiter(30, 1)
+CHAT_LIMITER = AsyncLimiter(1, 1)
+MAX_SEND_ATTEMPTS = 3
+
 # Firebase setup
 FIREBASE_CREDS_PATH = 'firebase-creds.json'
 if not firebase_admin._apps:
@@ -50,64 +55,110 @@ if not firebase_admin._apps:
 db = firestore.client()
 
 
+async def post_bot_api(method: str, data: dict, files: dict = None) -> httpx.Response:
+    """POST to the Bot API within its rate limits, waiting out 429 Retry-After"""
+    for attempt in range(MAX_SEND_ATTEMPTS):
+        async with BOT_API_LIMITER, CHAT_LIMITER:
+            response = await http_client.post(f"/bot{BOT_TOKEN}/{method}", data=data, files=files)
+        if response.status_code != 429 or attempt == MAX_SEND_ATTEMPTS - 1:
+            return response
+
+        retry_after = int(
+            response.headers.get('retry-after')
+            or response.json().get('parameters', {}).get('retry_after', 1)
+        )
+        logger.warning(f"Bot API rate limit hit, retrying in {retry_after}s")
+        await asyncio.sleep(retry_after)
+
+
 async def send_telegram_message(text: str):
     """Send message via Telegram Bot API"""
-    async with httpx.AsyncClient() as client:
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-        data = {
-            'chat_id': TARGET_USER_ID,
-            'text': text,
-            'parse_mode': 'HTML',
-            'disable_web_page_preview': False
-        }
-        response = await client.post(url, data=data)
-        if response.status_code != 200:
-            logger.error(f"Telegram API error: {response.text}")
-        return response.status_code == 200
-
-
-def save_news_to_firebase(news_data: dict, agent) -> str:
-    """Save news to Firebase with translations and return document ID"""
-    doc_id = str(uuid.uuid4())[:8]
-
-    ru_text = news_data['rephrased']
-
-    # Generate translations
-    logger.info(f"Translating to Uzbek...")
-    uz_text = agent.translate_text(ru_text, 'uz') or ''
-
-    logger.info(f"Translating to English...")
-    en_text = agent.translate_text(ru_text, 'en') or ''
-
-    doc_data = {
-        'id': doc_id,
-        'channel': news_data['channel'],
-        'text': ru_text,
-        'original_text': news_data['original'][:500],
-        'date': datetime.now().isoformat(),
-        'confidence': news_data['confidence'],
-        'translations': {
-            'ru': ru_text,
-            'uz': uz_text,
-            'en': en_text
-        },
-        'status': 'pending',
-        'created_at': firestore.SERVER_TIMESTAMP
+    data = {
+        'chat_id': TARGET_USER_ID,
+        'text': text,
+        'parse_mode': 'HTML',
+        'disable_web_page_preview': False
     }
-
-    db.collection('news_preview').document(doc_id).set(doc_data)
-    logger.info(f"Saved news to Firebase: {doc_id}")
-
-    return doc_id
+    response = await post_bot_api("sendMessage", data)
+    if response.status_code != 200:
+        logger.error(f"Telegram API error: {response.text}")
+    return response.status_code == 200
+
+
+async def translate_news(found_news: List[dict], agent):
+    """Translate all rephrased news to Uzbek and English concurrently"""
+    # Identical texts (e.g. a rephrase that fell back to the same original)
+    # are translated once; concurrent duplicates would all miss the agent cache
+    ru_texts = list(dict.fromkeys(news['rephrased'] for news in found_news))
+    logger.info(f"Translating {len(ru_texts)} news to Uzbek and English...")
+    uz_texts, en_texts = await asyncio.gather(
+        asyncio.gather(*(agent.translate_text(text, 'uz') for text in ru_texts)),
+        asyncio.gather(*(agent.translate_text(text, 'en') for text in ru_texts))
+    )
+    uz_by_text = dict(zip(ru_texts, uz_texts))
+    en_by_text = dict(zip(ru_texts, en_texts))
+    for news in found_news:
+        news['uz'] = uz_by_text[news['rephrased']] or ''
+        news['en'] = en_by_text[news['rephrased']] or ''
+
+
+async def save_news_to_firebase(found_news: List[dict]) -> List[str]:
+    """Save translated news to Firebase in batched commits and return document IDs"""
+    preview_ref = db.collection('news_preview')
+    doc_ids = []
+
+    # Up to 500 writes per commit
+    batches = []
+    for i in range(0, len(found_news), FIRESTORE_BATCH_LIMIT):
+        batch = db.batch()
+        for news_data in found_news[i:i + FIRESTORE_BATCH_LIMIT]:
+            # 8 URL-safe characters, 48 random bits
+            doc_id = secrets.token_urlsafe(6)
+            doc_ids.append(doc_id)
+
+            ru_text = news_data['rephrased']
+            batch.set(preview_ref.document(doc_id), {
+                'id': doc_id,
+                'channel': news_data['channel'],
+                'text': ru_text,
+                'original_text': news_data['original'][:500],
+                'confidence': news_data['confidence'],
+                'translations': {
+                    'ru': ru_text,
+                    'uz': news_data['uz'],
+                    'en': news_data['en']
+                },
+                'status': 'pending',
+                'created_at': firestore.SERVER_TIMESTAMP
+            })
+        batches.append(batch)
+
+    # Commits are blocking gRPC calls - run them in threads, in parallel
+    await asyncio.gather(*(asyncio.to_thread(batch.commit) for batch in batches))
+    logger.info(f"Saved {len(doc_ids)} news to Firebase")
+
+    return doc_ids
 
 
 async def main():
     logger.info("Starting news analysis...")
 
+    if not BOT_TOKEN:
+        raise ValueError("NEWS_BOT_TOKEN not set in environment")
+
     # Initialize Telethon for reading channels
-    tg_client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
+    tg_client = create_tg_client()
     await tg_client.start()
 
+    global http_client
+    # One pooled HTTP/2 connection reused by every send
+    http_client = httpx.AsyncClient(
+        base_url="https://api.telegram.org",
+        http2=True,
+        timeout=10,
+        limits=httpx.Limits(max_keepalive_connections=8)
+    )
+
     try:
         # Send start message
         await send_telegram_message(
@@ -115,49 +166,8 @@ async def main():
             "Ищу релевантные новости за последние 48 часов..."
         )
 
-        agent = get_agent()
-        found_news = []
-        cutoff_time = datetime.now() - timedelta(hours=48)
-
-        for channel in CHANNELS_TO_MONITOR:
-            try:
-                logger.info(f"Checking {channel}...")
-
-                async for message in tg_client.iter_messages(channel, limit=30):
-                    if not isinstance(message, Message):
-                        continue
-
-                    if message.date.replace(tzinfo=None) < cutoff_time:
-                        break
-
-                    text = message.text or ""
-                    if len(text) < 50:
-                        continue
-
-                    try:
-                        analysis = agent.is_air_quality_news(text)
-
-                        if analysis.get('is_air_quality_news') and analysis.get('confidence', 0) >= MIN_CONFIDENCE:
-                            logger.info(f"Found relevant post in {channel}")
-
-                            # Rephrase
-                            rephrased = agent.rephrase_news(text)
-
-                            found_news.append({
-                                'channel': channel,
-                                'original': text,
-                                'rephrased': rephrased or text,
-                                'confidence': analysis.get('confidence', 0),
-                                'message_id': message.id
-                            })
-
-                    except Exception as e:
-                        logger.error(f"Analysis error: {e}")
-                        continue
-
-            except Exception as e:
-                logger.error(f"Channel {channel} error: {e}")
-                continue
+        posts = await scan_candidates(tg_client, CHANNELS_TO_MONITOR, hours_back=48)
+        found_news = await find_news(posts, MIN_CONFIDENCE)
 
         if not found_news:
             await send_telegram_message(
@@ -170,24 +180,21 @@ async def main():
                 "Отправляю ссылки на превью..."
             )
 
-            for i, news in enumerate(found_news):
-                # Save to Firebase with translations
-                doc_id = save_news_to_firebase(news, agent)
-
-                # Generate preview URL
-                preview_url = f"{NEWS_PREVIEW_URL}/{doc_id}"
+            await translate_news(found_news, get_agent())
 
-                # Send message with link
-                msg = (
-                    f"📰 <b>Новость #{i+1}</b>\n"
-                    f"📢 Источник: {news['channel']}\n"
-                    f"📊 Уверенность: {news['confidence']:.0%}\n\n"
-                    f"<b>Превью:</b>\n{preview_url}\n\n"
-                    f"<i>Текст:</i> {news['rephrased'][:200]}..."
-                )
+            doc_ids = await save_news_to_firebase(found_news)
 
-                await send_telegram_message(msg)
-                await asyncio.sleep(1)
+            # Send the preview links one by one so the chat gets them in order
+            messages = [
+                f"📰 <b>Новость #{i+1}</b>\n"
+                f"📢 Источник: {news['channel']}\n"
+                f"📊 Уверенность: {news['confidence']:.0%}\n\n"
+                f"<b>Превью:</b>\n{NEWS_PREVIEW_URL}/{doc_id}\n\n"
+                f"<i>Текст:</i> {news['rephrased'][:200]}..."
+                for i, (news, doc_id) in enumerate(zip(found_news, doc_ids))
+            ]
+            for msg_text in messages:
+                await send_telegram_message(msg_text)
 
             # Final summary
             await send_telegram_message(
@@ -202,6 +209,8 @@ async def main():
 
     finally:
         await tg_client.disconnect()
+        await http_client.aclose()
+        await close_agent()
 
 
 if __name__ == "__main__":
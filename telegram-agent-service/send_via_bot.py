@@ -2,136 +2,138 @@
 Send air quality news via Telegram Bot (not Telethon user account)
 """
 
+import io
 import os
 import asyncio
-from datetime import datetime, timedelta
 import logging
+from typing import Optional
 import httpx
+from aiolimiter import AsyncLimiter
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from telethon import TelegramClient
-from telethon.tl.types import Message
-
-from air_quality_agent import get_agent
+from air_quality_agent import close_agent
+from pipeline import create_tg_client, find_news, scan_candidates
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Telethon for reading channels (user account)
-API_ID = int(os.getenv('TELEGRAM_API_ID', '0'))
-API_HASH = os.getenv('TELEGRAM_API_HASH', '')
-SESSION_NAME = 'air_quality_bot'
-
 # Bot for sending messages
-BOT_TOKEN = '8333357201:AAFc4DBdgbbxH_mT4wJMZ8ieLGY_s3Zg0x8'
+BOT_TOKEN = os.getenv('NEWS_BOT_TOKEN', '')
 TARGET_USER_ID = 832620295
 
+# Bot API client, opened in main() and reused for every request
+http_client: Optional[httpx.AsyncClient] = None
+
 CHANNELS_TO_MONITOR = ['@kunuzofficial', '@uza_uz', '@Daryo', '@zamonuz']
 MIN_CONFIDENCE = 0.6
 
+# Bot API limits: 30 messages/s overall, 1 message/s to the same chat
+BOT_API_LIMITER = AsyncLimiter(30, 1)
+CHAT_LIMITER = AsyncLimiter(1, 1)
+MAX_SEND_ATTEMPTS = 3
 
-async def send_telegram_message(text: str, photo_path: str = None):
-    """Send message via Telegram Bot API using httpx"""
-    async with httpx.AsyncClient() as client:
-        if photo_path:
-            url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendPhoto"
-            with open(photo_path, 'rb') as photo:
-                files = {'photo': photo}
-                data = {
-                    'chat_id': TARGET_USER_ID,
-                    'caption': text[:1024],
-                    'parse_mode': 'Markdown'
-                }
-                response = await client.post(url, data=data, files=files)
-        else:
-            url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-            data = {
-                'chat_id': TARGET_USER_ID,
-                'text': text,
-                'parse_mode': 'Markdown'
-            }
-            response = await client.post(url, data=data)
-
-        if response.status_code != 200:
-            logger.error(f"Telegram API error: {response.text}")
-        return response.status_code == 200
+
+async def post_bot_api(method: str, data: dict, files: dict = None) -> httpx.Response:
+    """POST to the Bot API within its rate limits, waiting out 429 Retry-After"""
+    for attempt in range(MAX_SEND_ATTEMPTS):
+        async with BOT_API_LIMITER, CHAT_LIMITER:
+            response = await http_client.post(f"/bot{BOT_TOKEN}/{method}", data=data, files=files)
+        if response.status_code != 429 or attempt == MAX_SEND_ATTEMPTS - 1:
+            return response
+
+        retry_after = int(
+            response.headers.get('retry-after')
+            or response.json().get('parameters', {}).get('retry_after', 1)
+        )
+        logger.warning(f"Bot API rate limit hit, retrying in {retry_after}s")
+        await asyncio.sleep(retry_after)
+
+
+async def send_telegram_message(text: str, photo: Optional[io.BytesIO] = None):
+    """Send message via Telegram Bot API over the shared httpx client"""
+    if photo:
+        files = {'photo': ('photo.jpg', photo.getvalue(), 'image/jpeg')}
+        data = {
+            'chat_id': TARGET_USER_ID,
+            'caption': text[:1024],
+            'parse_mode': 'Markdown'
+        }
+        response = await post_bot_api("sendPhoto", data, files)
+    else:
+        data = {
+            'chat_id': TARGET_USER_ID,
+            'text': text,
+            'parse_mode': 'Markdown'
+        }
+        response = await post_bot_api("sendMessage", data)
+
+    if response.status_code != 200:
+        logger.error(f"Telegram API error: {response.text}")
+    return response.status_code == 200
+
+
+async def download_photo(message) -> Optional[io.BytesIO]:
+    """Download the post photo into memory, None if the post has none"""
+    if not message.photo:
+        return None
+    try:
+        photo = io.BytesIO()
+        await message.download_media(file=photo)
+        photo.seek(0)
+        return photo
+    except Exception as e:
+        logger.error(f"Failed to download photo: {e}")
+        return None
 
 
 async def main():
     logger.info("Starting...")
 
+    if not BOT_TOKEN:
+        raise ValueError("NEWS_BOT_TOKEN not set in environment")
+
     # Initialize Telethon for reading channels
-    tg_client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
+    tg_client = create_tg_client()
     await tg_client.start()
 
+    global http_client
+    # One pooled HTTP/2 connection reused by every send
+    http_client = httpx.AsyncClient(
+        base_url="https://api.telegram.org",
+        http2=True,
+        timeout=10,
+        limits=httpx.Limits(max_keepalive_connections=8)
+    )
+
     try:
         # Send start message via bot
         await send_telegram_message(
             "🔍 *Анализ новостей о качестве воздуха*\n\nИщу релевантные новости за последние 48 часов..."
         )
 
-        agent = get_agent()
+        posts = await scan_candidates(tg_client, CHANNELS_TO_MONITOR, hours_back=48)
+        found_news = await find_news(posts, MIN_CONFIDENCE)
+
+        # Download photos concurrently, then send one by one so the chat gets the posts in order
+        photos = await asyncio.gather(*(download_photo(news['message']) for news in found_news))
+        messages = [
+            f"📰 *Новость #{i + 1}*\n"
+            f"📢 Источник: {news['channel']}\n"
+            f"📊 Уверенность: {news['confidence']:.0%}\n\n"
+            f"*Текст для публикации:*\n{news['rephrased']}\n\n"
+            f"---\n"
+            f"_Оригинал:_ {news['original'][:200]}..."
+            for i, news in enumerate(found_news)
+        ]
         relevant_count = 0
-        cutoff_time = datetime.now() - timedelta(hours=48)
-
-        for channel in CHANNELS_TO_MONITOR:
+        for msg_text, photo in zip(messages, photos):
             try:
-                logger.info(f"Checking {channel}...")
-
-                async for message in tg_client.iter_messages(channel, limit=30):
-                    if not isinstance(message, Message):
-                        continue
-
-                    if message.date.replace(tzinfo=None) < cutoff_time:
-                        break
-
-                    text = message.text or ""
-                    if len(text) < 50:
-                        continue
-
-                    # Analyze
-                    try:
-                        analysis = agent.is_air_quality_news(text)
-
-                        if analysis.get('is_air_quality_news') and analysis.get('confidence', 0) >= MIN_CONFIDENCE:
-                            logger.info(f"Found relevant post in {channel}")
-
-                            # Rephrase
-                            rephrased = agent.rephrase_news(text)
-
-                            # Format message
-                            msg_text = (
-                                f"📰 *Новость #{relevant_count + 1}*\n"
-                                f"📢 Источник: {channel}\n"
-                                f"📊 Уверенность: {analysis.get('confidence', 0):.0%}\n\n"
-                                f"*Текст для публикации:*\n{rephrased or text[:500]}\n\n"
-                                f"---\n"
-                                f"_Оригинал:_ {text[:200]}..."
-                            )
-
-                            # Send via bot
-                            if message.photo:
-                                # Download photo first
-                                photo_path = f"./media/temp_{message.id}.jpg"
-                                await message.download_media(file=photo_path)
-                                await send_telegram_message(msg_text, photo_path)
-                                # Clean up
-                                os.remove(photo_path)
-                            else:
-                                await send_telegram_message(msg_text)
-
-                            relevant_count += 1
-                            await asyncio.sleep(2)
-
-                    except Exception as e:
-                        logger.error(f"Analysis error: {e}")
-                        continue
-
+                if await send_telegram_message(msg_text, photo) is True:
+                    relevant_count += 1
             except Exception as e:
-                logger.error(f"Channel {channel} error: {e}")
-                continue
+                logger.error(f"Send error: {e}")
 
         # Final message via bot
         await send_telegram_message(
@@ -145,6 +147,8 @@ async def main():
 
     finally:
         await tg_client.disconnect()
+        await http_client.aclose()
+        await close_agent()
 
 
 if __name__ == "__main__":
@@ -5,16 +5,146 @@ Uses external search APIs for web search (Tavily, SerpAPI, or Google)
 """
 
 import os
+import re
 import json
 import asyncio
 import logging
 import time
-import requests
+import base64
+import hashlib
+import sqlite3
+import threading
+import httpx
+import orjson
+import aiofiles
+from aiolimiter import AsyncLimiter
+from collections import deque
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+
+from bedrock_stream import RETRY_STATUS_CODES, backoff, read_stream_events
+from post_dedup import PostDeduplicator
 
 logger = logging.getLogger(__name__)
 
+# Search queries, most preferred first
+SEARCH_QUERIES = [
+    "качество воздуха Ташкент AQI сегодня",
+    "загрязнение воздуха Узбекистан смог PM2.5",
+    "air quality Tashkent Uzbekistan"
+]
+
+# Seconds to wait for a search provider before also asking the next one
+SEARCH_HEDGE_DELAY = 2.0
+# Providers failing more than this share of their recent searches are asked last
+PROVIDER_OUTCOME_WINDOW = 10
+PROVIDER_MIN_OUTCOMES = 3
+PROVIDER_MAX_FAILURE_RATE = 0.5
+
+# Claude responses are reused for this long; search results change through the day
+LLM_CACHE_DB = 'web_search_cache.db'
+LLM_CACHE_TTL_SECONDS = 1800
+
+# Claude prompts; PROCESS_PROMPT_TEMPLATE takes the formatted search results
+PROCESS_SYSTEM_PROMPT = """Ты профессиональный новостной редактор, специализирующийся на экологии и качестве воздуха.
+Твоя задача - создать информативные новости на основе результатов поиска."""
+
+PROCESS_PROMPT_TEMPLATE = """На основе следующих результатов поиска создай новости о качестве воздуха в Узбекистане: по одной новости на каждую группу результатов.
+Если разные группы описывают одно и то же событие, объедини их в одну новость.
+
+РЕЗУЛЬТАТЫ ПОИСКА:
+{results}
+
+Создай новости в формате JSON:
+{{
+    "news": [
+        {{
+            "title": "Заголовок новости на русском (краткий, информативный)",
+            "summary": "Содержание новости на русском (3-5 предложений). ОБЯЗАТЕЛЬНО сохрани все числовые данные: AQI, PM2.5, PM10, температуру и т.д. Добавь рекомендации для населения если есть.",
+            "source": "Название источника",
+            "source_url": "URL источника",
+            "image_query": "Поисковый запрос для изображения на английском (например: 'Tashkent city smog air pollution')",
+            "group": 1
+        }}
+    ]
+}}
+
+ВАЖНО:
+- Минимум 1 новость ОБЯЗАТЕЛЬНА
+- В поле "group" укажи номер ГРУППЫ, на основе которой написана новость
+- Сохраняй ВСЕ числовые данные из источников
+- Пиши на русском языке
+- Если данных мало, добавь общие рекомендации по защите от загрязнения воздуха
+- Не выдумывай цифры, используй только те что есть в источниках"""
+
+FALLBACK_SYSTEM_PROMPT = """Ты эксперт по качеству воздуха в Узбекистане и Центральной Азии."""
+
+FALLBACK_PROMPT = """Создай информативную новость о качестве воздуха в Ташкенте.
+
+Используй типичные данные для зимнего периода в Ташкенте:
+- AQI обычно от 100 до 200+ в зимние месяцы
+- PM2.5 часто превышает норму ВОЗ
+- Основные источники: отопление, транспорт, промышленность
+
+Верни в формате JSON:
+{
+    "news": [
+        {
+            "title": "Заголовок на русском",
+            "summary": "Содержание 3-5 предложений с типичными показателями и рекомендациями",
+            "source": "Мониторинг качества воздуха",
+            "source_url": "https://aqicn.org/city/tashkent/",
+            "image_query": "Tashkent winter smog air pollution cityscape"
+        }
+    ]
+}
+
+ВАЖНО: Укажи что данные являются типичными для сезона и рекомендуй проверить актуальные показатели."""
+
+# Body type of the pre-encoded orjson requests
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Read size for streamed image downloads
+IMAGE_CHUNK_SIZE = 1 << 16
+# JPEGs are already compressed; identity skips a useless gzip layer
+IMAGE_DOWNLOAD_HEADERS = {'Accept-Encoding': 'identity'}
+
+# JSON answer inside Claude's reply, from the first opening to the last closing bracket
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+_JSON_ARRAY_RE = re.compile(r"\[.*\]", re.DOTALL)
+
+
+class _JsonEndScanner:
+    """
+    Incremental bracket scan of a streamed answer
+    feed() returns True once the first top-level JSON object has been closed;
+    each character is looked at only once however many chunks arrive
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text: str) -> bool:
+        for char in text:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"' and self.depth:
+                self.in_string = True
+            elif char == '{' or (char == '[' and self.depth):
+                self.depth += 1
+            elif char in '}]' and self.depth:
+                self.depth -= 1
+                if not self.depth:
+                    return True
+        return False
+
 
 class WebSearchNewsAgent:
     """AI Agent that searches the web for air quality news in Uzbekistan"""
@@ -25,6 +155,7 @@ class WebSearchNewsAgent:
         # Use Claude Sonnet for better quality
         self.model_id = 'us.anthropic.claude-sonnet-4-20250514-v1:0'
         self.endpoint = f"https://bedrock-runtime.{self.region}.amazonaws.com/model/{self.model_id}/invoke"
+        self.stream_endpoint = f"{self.endpoint}-with-response-stream"
 
         # Search API keys
         self.tavily_api_key = os.getenv('TAVILY_API_KEY', '')
@@ -32,12 +163,126 @@ class WebSearchNewsAgent:
         self.google_api_key = os.getenv('GOOGLE_API_KEY', '')
         self.google_cx = os.getenv('GOOGLE_CX', '')  # Custom Search Engine ID
 
+        # Configured search providers in preference order
+        self._providers = tuple(
+            (name, search) for name, search, configured in (
+                ('Tavily', self._search_tavily, self.tavily_api_key),
+                ('SerpAPI', self._search_serp, self.serp_api_key),
+                ('Google', self._search_google, self.google_api_key and self.google_cx),
+            ) if configured
+        )
+        if not self._providers:
+            logger.warning("No search API configured, news will come from fallback generation")
+
         if not self.bearer_token:
             raise ValueError("AWS_BEARER_TOKEN_BEDROCK not set in environment")
 
+        # Fixed headers of every Bedrock request, built once
+        self._bedrock_headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.bearer_token}",
+            "Accept": "application/vnd.amazon.eventstream"
+        }
+
+        # Pooled HTTP client for Bedrock, search and image calls, created on first use in the running event loop
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # Exact-match SQLite cache of Claude responses; no fuzzy matching, since prompts
+        # differing only in AQI/PM values must not share an answer
+        self._db: Optional[sqlite3.Connection] = None
+
+        # Proactive rate limits, so requests wait for a slot instead of backing off on 429:
+        # Bedrock per second (same setting as air_quality_agent), search and image APIs per minute.
+        # Read here rather than at import, so a later load_dotenv() still applies
+        self._bedrock_limiter = AsyncLimiter(int(os.getenv('BEDROCK_RPS', '10')), 1)
+        self._image_limiter = AsyncLimiter(int(os.getenv('IMAGE_API_RPM', '30')), 60)
+        self._search_limiters = {
+            'Tavily': AsyncLimiter(int(os.getenv('TAVILY_RPM', '100')), 60),
+            'SerpAPI': AsyncLimiter(int(os.getenv('SERP_RPM', '60')), 60),
+            'Google': AsyncLimiter(int(os.getenv('GOOGLE_RPM', '100')), 60),
+        }
+
+        # Recent success/failure of each search provider
+        self._provider_outcomes: Dict[str, deque] = {}
+
         logger.info(f"WebSearchNewsAgent initialized with {self.model_id}")
 
-    def _call_claude(self, prompt: str, system_prompt: str = None, max_tokens: int = 2048) -> Optional[str]:
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=True,
+                # Concurrent requests to one host (Bedrock, hedged searches) share a connection
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                timeout=httpx.Timeout(30),
+                headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+            )
+        return self._client
+
+    async def close(self):
+        """Close the pooled HTTP client and the cache database; they are reopened on next use"""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _cache_key(self, prompt: str, system_prompt: Optional[str], max_tokens: int) -> str:
+        payload = json.dumps(
+            {"m": self.model_id, "p": prompt, "s": system_prompt, "t": max_tokens},
+            sort_keys=True
+        )
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _get_db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(LLM_CACHE_DB)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, response TEXT, ts INTEGER)'
+            )
+            self._db.execute(
+                'DELETE FROM llm_cache WHERE ts < ?',
+                (int(time.time()) - LLM_CACHE_TTL_SECONDS,)
+            )
+            self._db.commit()
+        return self._db
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        try:
+            row = self._get_db().execute(
+                'SELECT response FROM llm_cache WHERE key = ? AND ts >= ?',
+                (key, int(time.time()) - LLM_CACHE_TTL_SECONDS)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            row = None
+        return row[0] if row is not None else None
+
+    def _cache_put(self, key: str, response: str):
+        try:
+            db = self._get_db()
+            db.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, response, ts) VALUES (?, ?, ?)',
+                (key, response, int(time.time()))
+            )
+            db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    async def _call_claude(self, prompt: str, system_prompt: str = None, max_tokens: int = 2048) -> Optional[str]:
+        """Call Claude, serving repeated identical requests from the response cache"""
+        key = self._cache_key(prompt, system_prompt, max_tokens)
+        cached = self._cache_get(key)
+        if cached is not None:
+            logger.info("Claude response served from cache")
+            return cached
+
+        response = await self._invoke_claude(prompt, system_prompt, max_tokens)
+        if response is not None:
+            self._cache_put(key, response)
+        return response
+
+    async def _invoke_claude(self, prompt: str, system_prompt: str = None, max_tokens: int = 2048) -> Optional[str]:
         """Call Claude via AWS Bedrock HTTP API with Bearer token"""
         max_retries = 3
 
@@ -53,62 +298,77 @@ class WebSearchNewsAgent:
                 if system_prompt:
                     body["system"] = system_prompt
 
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.bearer_token}",
-                    "Accept": "application/json"
-                }
-
-                response = requests.post(
-                    self.endpoint,
-                    headers=headers,
-                    json=body,
-                    timeout=90
-                )
-
-                if response.status_code == 429:
-                    wait_time = 5 * (attempt + 1)
-                    logger.warning(f"Rate limited. Waiting {wait_time}s before retry...")
-                    time.sleep(wait_time)
-                    continue
-
-                if response.status_code != 200:
-                    logger.error(f"Bedrock API error: {response.status_code} - {response.text}")
-                    return None
-
-                response_data = response.json()
-                time.sleep(1)
-                return response_data['content'][0]['text']
+                # Streamed, so reading stops as soon as the JSON answer is closed
+                async with self._bedrock_limiter:
+                    async with self._get_client().stream(
+                        "POST",
+                        self.stream_endpoint,
+                        headers=self._bedrock_headers,
+                        content=orjson.dumps(body),
+                        timeout=90
+                    ) as response:
+                        if response.status_code in RETRY_STATUS_CODES:
+                            wait_time = backoff(attempt)
+                            logger.warning(f"Bedrock returned {response.status_code}. Waiting {wait_time:.1f}s before retry...")
+                            await asyncio.sleep(wait_time)
+                            continue
+
+                        if response.status_code != 200:
+                            await response.aread()
+                            logger.error(f"Bedrock API error: {response.status_code} - {response.text}")
+                            return None
+
+                        parts = []
+                        scanner = _JsonEndScanner()
+                        closed = False
+                        buffer = bytearray()
+                        async for chunk in response.aiter_bytes():
+                            buffer.extend(chunk)
+                            for event in read_stream_events(buffer):
+                                if 'bytes' not in event:
+                                    logger.error(f"Bedrock stream error: {event}")
+                                    return None
+                                delta = orjson.loads(base64.b64decode(event['bytes']))
+                                if delta.get('type') == 'content_block_delta' and not closed:
+                                    part = delta['delta'].get('text', '')
+                                    parts.append(part)
+                                    closed = scanner.feed(part)
+                            if closed:
+                                break
+                        text = "".join(parts)
+
+                return text or None
 
             except Exception as e:
                 logger.error(f"Bedrock API error: {e}")
                 if attempt < max_retries - 1:
-                    time.sleep(3)
+                    await asyncio.sleep(backoff(attempt))
                 continue
 
         logger.error("Max retries exceeded")
         return None
 
-    def _search_tavily(self, query: str) -> List[Dict[str, Any]]:
+    async def _search_tavily(self, query: str) -> Tuple[List[Dict[str, Any]], List[str]]:
         """Search using Tavily API"""
         if not self.tavily_api_key:
-            return []
+            return [], []
 
         try:
-            response = requests.post(
-                "https://api.tavily.com/search",
-                json={
-                    "api_key": self.tavily_api_key,
-                    "query": query,
-                    "search_depth": "advanced",
-                    "include_images": True,
-                    "max_results": 5
-                },
-                timeout=30
-            )
+            async with self._search_limiters['Tavily']:
+                response = await self._get_client().post(
+                    "https://api.tavily.com/search",
+                    headers=JSON_HEADERS,
+                    content=orjson.dumps({
+                        "api_key": self.tavily_api_key,
+                        "query": query,
+                        "search_depth": "advanced",
+                        "include_images": True,
+                        "max_results": 5
+                    })
+                )
 
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 results = []
                 for r in data.get('results', []):
                     results.append({
@@ -127,26 +387,26 @@ class WebSearchNewsAgent:
 
         return [], []
 
-    def _search_serp(self, query: str) -> List[Dict[str, Any]]:
+    async def _search_serp(self, query: str) -> Tuple[List[Dict[str, Any]], List[str]]:
         """Search using SerpAPI"""
         if not self.serp_api_key:
             return [], []
 
         try:
-            response = requests.get(
-                "https://serpapi.com/search",
-                params={
-                    "api_key": self.serp_api_key,
-                    "q": query,
-                    "engine": "google",
-                    "num": 5,
-                    "hl": "ru"
-                },
-                timeout=30
-            )
+            async with self._search_limiters['SerpAPI']:
+                response = await self._get_client().get(
+                    "https://serpapi.com/search",
+                    params={
+                        "api_key": self.serp_api_key,
+                        "q": query,
+                        "engine": "google",
+                        "num": 5,
+                        "hl": "ru"
+                    }
+                )
 
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 results = []
                 for r in data.get('organic_results', []):
                     results.append({
@@ -165,26 +425,26 @@ class WebSearchNewsAgent:
 
         return [], []
 
-    def _search_google(self, query: str) -> List[Dict[str, Any]]:
+    async def _search_google(self, query: str) -> Tuple[List[Dict[str, Any]], List[str]]:
         """Search using Google Custom Search API"""
         if not self.google_api_key or not self.google_cx:
             return [], []
 
         try:
-            response = requests.get(
-                "https://www.googleapis.com/customsearch/v1",
-                params={
-                    "key": self.google_api_key,
-                    "cx": self.google_cx,
-                    "q": query,
-                    "num": 5,
-                    "lr": "lang_ru"
-                },
-                timeout=30
-            )
+            async with self._search_limiters['Google']:
+                response = await self._get_client().get(
+                    "https://www.googleapis.com/customsearch/v1",
+                    params={
+                        "key": self.google_api_key,
+                        "cx": self.google_cx,
+                        "q": query,
+                        "num": 5,
+                        "lr": "lang_ru"
+                    }
+                )
 
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 results = []
                 images = []
                 for r in data.get('items', []):
@@ -206,143 +466,147 @@ class WebSearchNewsAgent:
 
         return [], []
 
-    def web_search(self, query: str) -> tuple:
+    def _available_providers(self) -> List[Tuple[str, Any]]:
+        """Configured providers in preference order, chronically failing ones moved to the end"""
+
+        def failing(provider) -> bool:
+            outcomes = self._provider_outcomes.get(provider[0])
+            return bool(outcomes) and len(outcomes) >= PROVIDER_MIN_OUTCOMES and \
+                outcomes.count(False) / len(outcomes) > PROVIDER_MAX_FAILURE_RATE
+
+        # Stable sort keeps the preference order inside both groups
+        return sorted(self._providers, key=failing)
+
+    def _record_outcome(self, provider: str, ok: bool):
+        self._provider_outcomes.setdefault(provider, deque(maxlen=PROVIDER_OUTCOME_WINDOW)).append(ok)
+
+    async def web_search(self, query: str) -> Tuple[List[Dict[str, Any]], List[str]]:
         """
         Perform web search using available API
         Returns (results, images)
+
+        Hedged: the preferred provider starts at once, the next one starts when
+        the previous fails or has not answered within SEARCH_HEDGE_DELAY seconds.
+        The first non-empty answer wins and the slower requests are cancelled.
         """
-        # Try Tavily first (best for news)
-        results, images = self._search_tavily(query)
-        if results:
-            logger.info(f"Found {len(results)} results via Tavily")
-            return results, images
-
-        # Try SerpAPI
-        results, images = self._search_serp(query)
-        if results:
-            logger.info(f"Found {len(results)} results via SerpAPI")
-            return results, images
-
-        # Try Google Custom Search
-        results, images = self._search_google(query)
-        if results:
-            logger.info(f"Found {len(results)} results via Google")
-            return results, images
-
-        logger.warning("No search API available or no results found")
+        if not self._providers:
+            return [], []
+
+        providers = self._available_providers()
+        pending: Dict[asyncio.Task, str] = {}
+
+        try:
+            while providers or pending:
+                if providers:
+                    name, search = providers.pop(0)
+                    pending[asyncio.create_task(search(query))] = name
+
+                # Without providers left to hedge with, wait for the running ones
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=SEARCH_HEDGE_DELAY if providers else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+
+                for task in done:
+                    name = pending.pop(task)
+                    results, images = task.result()
+                    self._record_outcome(name, bool(results))
+                    if results:
+                        logger.info(f"Found {len(results)} results via {name}")
+                        return results, images
+        finally:
+            for task in pending:
+                task.cancel()
+
+        logger.warning(f"No search results found for: {query}")
         return [], []
 
-    def search_air_quality_news(self) -> List[Dict[str, Any]]:
+    async def search_air_quality_news(self) -> List[Dict[str, Any]]:
         """
         Search web for latest air quality news in Uzbekistan
         Returns list of news items
         """
+        # All queries run concurrently; every query with results becomes a group of the one Claude call
+        searches = await asyncio.gather(*(self.web_search(query) for query in SEARCH_QUERIES))
+        groups = self._dedup_groups([
+            (query, results, images) for query, (results, images) in zip(SEARCH_QUERIES, searches)
+        ])
 
-        # Search queries
-        queries = [
-            "качество воздуха Ташкент AQI сегодня",
-            "загрязнение воздуха Узбекистан смог PM2.5",
-            "air quality Tashkent Uzbekistan"
-        ]
-
-        all_results = []
-        all_images = []
-
-        for query in queries:
-            results, images = self.web_search(query)
-            all_results.extend(results)
-            all_images.extend(images)
-            if results:
-                break  # Got results, no need for more queries
-            time.sleep(1)
-
-        if not all_results:
+        if not groups:
             # No search results - use fallback
             logger.warning("No search results, using fallback generation")
-            return self._generate_fallback_news()
+            return await self._generate_fallback_news()
 
         # Use Claude to process search results into news format
-        return self._process_search_results(all_results, all_images)
-
-    def _process_search_results(self, results: List[Dict], images: List[str]) -> List[Dict[str, Any]]:
-        """Use Claude to process search results into news format"""
-
-        # Format results for Claude
-        results_text = ""
-        for i, r in enumerate(results[:5], 1):
-            results_text += f"\n{i}. {r['title']}\n   URL: {r['url']}\n   Содержание: {r['content']}\n"
-
-        system_prompt = """Ты профессиональный новостной редактор, специализирующийся на экологии и качестве воздуха.
-Твоя задача - создать информативные новости на основе результатов поиска."""
+        return await self._process_search_results(groups)
 
-        prompt = f"""На основе следующих результатов поиска создай 1-2 новости о качестве воздуха в Узбекистане.
+    @staticmethod
+    def _dedup_groups(groups: List[Tuple[str, List[Dict], List[str]]]) -> List[Tuple[str, List[Dict], List[str]]]:
+        """
+        Drop articles already returned for an earlier query, by URL or by (near-)identical content,
+        so overlapping queries don't repeat them in the Claude prompt; groups left empty are dropped
+        """
+        seen_urls = set()
+        dedup = PostDeduplicator()
+        unique_groups = []
+        for query, results, images in groups:
+            unique = []
+            for r in results:
+                if r['url'] and r['url'] in seen_urls:
+                    continue
+                seen_urls.add(r['url'])
+                if r['content'] and dedup.is_duplicate(r['content']):
+                    continue
+                unique.append(r)
+            if unique:
+                unique_groups.append((query, unique, images))
 
-РЕЗУЛЬТАТЫ ПОИСКА:
-{results_text}
+        dropped = sum(len(results) for _, results, _ in groups) - sum(len(results) for _, results, _ in unique_groups)
+        if dropped:
+            logger.info(f"Dropped {dropped} duplicate search results")
+        return unique_groups
 
-Создай новости в формате JSON:
-{{
-    "news": [
-        {{
-            "title": "Заголовок новости на русском (краткий, информативный)",
-            "summary": "Содержание новости на русском (3-5 предложений). ОБЯЗАТЕЛЬНО сохрани все числовые данные: AQI, PM2.5, PM10, температуру и т.д. Добавь рекомендации для населения если есть.",
-            "source": "Название источника",
-            "source_url": "URL источника",
-            "image_query": "Поисковый запрос для изображения на английском (например: 'Tashkent city smog air pollution')"
-        }}
-    ]
-}}
+    async def _process_search_results(self, groups: List[Tuple[str, List[Dict], List[str]]]) -> List[Dict[str, Any]]:
+        """
+        Use Claude to process search results into news format
+        All (query, results, images) groups go into a single request, one news item per group
+        """
 
-ВАЖНО:
-- Минимум 1 новость ОБЯЗАТЕЛЬНА
-- Сохраняй ВСЕ числовые данные из источников
-- Пиши на русском языке
-- Если данных мало, добавь общие рекомендации по защите от загрязнения воздуха
-- Не выдумывай цифры, используй только те что есть в источниках"""
+        # Format results for Claude, grouped by query
+        results_text = "".join(
+            f"\nГРУППА {g}. Запрос: {query}\n" + "".join(
+                f"\n{i}. {r['title']}\n   URL: {r['url']}\n   Содержание: {r['content']}\n"
+                for i, r in enumerate(results[:5], 1)
+            )
+            for g, (query, results, _) in enumerate(groups, 1)
+        )
+        prompt = PROCESS_PROMPT_TEMPLATE.format(results=results_text)
 
-        response = self._call_claude(prompt, system_prompt)
+        response = await self._call_claude(prompt, PROCESS_SYSTEM_PROMPT)
 
         if not response:
-            return self._generate_fallback_news()
+            return await self._generate_fallback_news()
 
         news_list = self._parse_news_response(response)
 
-        # Add found images to news
-        if images and news_list:
-            for i, news in enumerate(news_list):
-                if i < len(images) and images[i]:
-                    news['found_image_url'] = images[i]
+        # Give each news item the next unused image of the group Claude says it is based on
+        used_images = set()
+        for news in news_list:
+            group = news.pop('group', None)
+            if not isinstance(group, int) or not 1 <= group <= len(groups):
+                continue
+            image = next((image for image in groups[group - 1][2] if image and image not in used_images), None)
+            if image:
+                used_images.add(image)
+                news['found_image_url'] = image
 
         return news_list
 
-    def _generate_fallback_news(self) -> List[Dict[str, Any]]:
+    async def _generate_fallback_news(self) -> List[Dict[str, Any]]:
         """Generate a fallback news item when no search results available"""
 
-        system_prompt = """Ты эксперт по качеству воздуха в Узбекистане и Центральной Азии."""
-
-        prompt = """Создай информативную новость о качестве воздуха в Ташкенте.
-
-Используй типичные данные для зимнего периода в Ташкенте:
-- AQI обычно от 100 до 200+ в зимние месяцы
-- PM2.5 часто превышает норму ВОЗ
-- Основные источники: отопление, транспорт, промышленность
-
-Верни в формате JSON:
-{
-    "news": [
-        {
-            "title": "Заголовок на русском",
-            "summary": "Содержание 3-5 предложений с типичными показателями и рекомендациями",
-            "source": "Мониторинг качества воздуха",
-            "source_url": "https://aqicn.org/city/tashkent/",
-            "image_query": "Tashkent winter smog air pollution cityscape"
-        }
-    ]
-}
-
-ВАЖНО: Укажи что данные являются типичными для сезона и рекомендуй проверить актуальные показатели."""
-
-        response = self._call_claude(prompt, system_prompt)
+        response = await self._call_claude(FALLBACK_PROMPT, FALLBACK_SYSTEM_PROMPT)
 
         if response:
             return self._parse_news_response(response)
@@ -361,24 +625,15 @@ class WebSearchNewsAgent:
         if not response:
             return []
 
+        # Outermost object (or array) whatever surrounds it; a streamed answer
+        # is cut at the closing brace, so a ``` fence may never be closed
+        match = _JSON_OBJECT_RE.search(response) or _JSON_ARRAY_RE.search(response)
+        if not match:
+            logger.warning("No JSON in Claude response")
+            return []
+
         try:
-            cleaned = response.strip()
-
-            # Extract JSON from response
-            if '```json' in cleaned:
-                start = cleaned.find('```json') + 7
-                end = cleaned.find('```', start)
-                cleaned = cleaned[start:end].strip()
-            elif '```' in cleaned:
-                start = cleaned.find('```') + 3
-                end = cleaned.find('```', start)
-                cleaned = cleaned[start:end].strip()
-            elif '{' in cleaned:
-                start = cleaned.find('{')
-                end = cleaned.rfind('}') + 1
-                cleaned = cleaned[start:end]
-
-            data = json.loads(cleaned)
+            data = orjson.loads(match.group())
 
             if 'news' in data:
                 return data['news']
@@ -387,17 +642,18 @@ class WebSearchNewsAgent:
             else:
                 return [data]
 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.warning(f"Failed to parse JSON: {e}")
             return []
 
-    def search_and_download_image(self, query: str, output_path: str, found_url: str = None) -> Optional[str]:
+    async def search_and_download_image(self, query: str, output_path: str, found_url: str = None) -> Optional[str]:
         """
         Search for an image and download it
+        The directory of output_path must already exist
         """
         # If we already have a URL from search results, try it first
         if found_url:
-            downloaded = self._download_image(found_url, output_path)
+            downloaded = await self._download_image(found_url, output_path)
             if downloaded:
                 return downloaded
 
@@ -406,32 +662,32 @@ class WebSearchNewsAgent:
             # Unsplash (free)
             unsplash_key = os.getenv('UNSPLASH_ACCESS_KEY', '')
             if unsplash_key:
-                response = requests.get(
-                    "https://api.unsplash.com/search/photos",
-                    params={"query": query, "per_page": 1},
-                    headers={"Authorization": f"Client-ID {unsplash_key}"},
-                    timeout=30
-                )
+                async with self._image_limiter:
+                    response = await self._get_client().get(
+                        "https://api.unsplash.com/search/photos",
+                        params={"query": query, "per_page": 1},
+                        headers={"Authorization": f"Client-ID {unsplash_key}"}
+                    )
                 if response.status_code == 200:
-                    data = response.json()
+                    data = orjson.loads(response.content)
                     if data.get('results'):
                         image_url = data['results'][0]['urls']['regular']
-                        return self._download_image(image_url, output_path)
+                        return await self._download_image(image_url, output_path)
 
             # Pexels (free)
             pexels_key = os.getenv('PEXELS_API_KEY', '')
             if pexels_key:
-                response = requests.get(
-                    "https://api.pexels.com/v1/search",
-                    params={"query": query, "per_page": 1},
-                    headers={"Authorization": pexels_key},
-                    timeout=30
-                )
+                async with self._image_limiter:
+                    response = await self._get_client().get(
+                        "https://api.pexels.com/v1/search",
+                        params={"query": query, "per_page": 1},
+                        headers={"Authorization": pexels_key}
+                    )
                 if response.status_code == 200:
-                    data = response.json()
+                    data = orjson.loads(response.content)
                     if data.get('photos'):
                         image_url = data['photos'][0]['src']['large']
-                        return self._download_image(image_url, output_path)
+                        return await self._download_image(image_url, output_path)
 
             logger.warning("No image API configured or no images found")
             return None
@@ -440,30 +696,24 @@ class WebSearchNewsAgent:
             logger.error(f"Image search error: {e}")
             return None
 
-    def _download_image(self, url: str, output_path: str) -> Optional[str]:
-        """Download image from URL"""
+    async def _download_image(self, url: str, output_path: str) -> Optional[str]:
+        """Download image from URL; the caller makes sure the output directory exists"""
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            response = requests.get(url, timeout=30, stream=True, headers=headers)
-
-            if response.status_code == 200:
-                os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else '.', exist_ok=True)
-
-                with open(output_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
+            async with self._get_client().stream("GET", url, headers=IMAGE_DOWNLOAD_HEADERS) as response:
+                if response.status_code == 200:
+                    async with aiofiles.open(output_path, 'wb') as f:
+                        async for chunk in response.aiter_bytes(IMAGE_CHUNK_SIZE):
+                            await f.write(chunk)
 
-                logger.info(f"Downloaded image: {output_path}")
-                return output_path
+                    logger.info(f"Downloaded image: {output_path}")
+                    return output_path
 
         except Exception as e:
             logger.error(f"Failed to download image from {url}: {e}")
 
         return None
 
-    def get_news_with_images(self) -> List[Dict[str, Any]]:
+    async def get_news_with_images(self) -> List[Dict[str, Any]]:
         """
         Complete pipeline: search news, find images, download them
         Returns list of news with local image paths
@@ -471,7 +721,7 @@ class WebSearchNewsAgent:
         os.makedirs('./media', exist_ok=True)
 
         # Search for news
-        news_list = self.search_air_quality_news()
+        news_list = await self.search_air_quality_news()
 
         if not news_list:
             logger.warning("No news found")
@@ -479,12 +729,16 @@ class WebSearchNewsAgent:
 
         logger.info(f"Found {len(news_list)} news items")
 
-        # Process each news item
+        # Build each news item, then fetch all their images concurrently
         processed_news = []
+        image_jobs = []
+        # One timestamp for the whole batch; the index keeps the ids unique
+        now = datetime.now()
+        timestamp = int(now.timestamp())
+        date = now.isoformat()
 
         for i, news in enumerate(news_list):
             try:
-                timestamp = int(datetime.now().timestamp())
                 news_item = {
                     'id': f"web_search_{timestamp}_{i}",
                     'channel': 'web_search',
@@ -492,46 +746,56 @@ class WebSearchNewsAgent:
                     'text': news.get('summary', ''),
                     'source': news.get('source', 'Web'),
                     'source_url': news.get('source_url', ''),
-                    'date': datetime.now().isoformat(),
+                    'date': date,
                     'photo_path': None
                 }
 
-                # Try to download image
                 image_query = news.get('image_query', 'Tashkent air pollution')
                 found_image = news.get('found_image_url', '')
                 photo_path = f"./media/web_search_{timestamp}_{i}.jpg"
 
-                downloaded = self.search_and_download_image(image_query, photo_path, found_image)
-                if downloaded:
-                    news_item['photo_path'] = downloaded
-
                 processed_news.append(news_item)
-                time.sleep(1)
+                image_jobs.append(self.search_and_download_image(image_query, photo_path, found_image))
 
             except Exception as e:
                 logger.error(f"Error processing news item: {e}")
                 continue
 
+        downloads = await asyncio.gather(*image_jobs, return_exceptions=True)
+        for news_item, downloaded in zip(processed_news, downloads):
+            if isinstance(downloaded, Exception):
+                logger.error(f"Image download error: {downloaded}")
+            elif downloaded:
+                news_item['photo_path'] = downloaded
+
         return processed_news
 
 
 # Singleton instance
 _web_search_agent = None
+_web_search_agent_lock = threading.Lock()
 
 
 def get_web_search_agent() -> WebSearchNewsAgent:
-    """Get or create singleton agent instance"""
+    """Get or create singleton agent instance (safe to call from any thread)"""
     global _web_search_agent
     if _web_search_agent is None:
-        _web_search_agent = WebSearchNewsAgent()
+        with _web_search_agent_lock:
+            if _web_search_agent is None:
+                _web_search_agent = WebSearchNewsAgent()
     return _web_search_agent
 
 
+async def close_web_search_agent():
+    """Close the singleton agent's HTTP client if the agent was created"""
+    if _web_search_agent is not None:
+        await _web_search_agent.close()
+
+
 async def search_web_for_news() -> List[Dict[str, Any]]:
     """
     Convenience async function to search web for air quality news
     Returns list of news items ready for posting
     """
     agent = get_web_search_agent()
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, agent.get_news_with_images)
+    return await agent.get_news_with_images()